@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+@File      :   benchmarks/bench_defer.py
+@Time      :   2023/03
+@License   :   MIT
+
+Microbenchmarks of the Defer engine: cost of setting up chains and
+latency from the triggering future completing to the chain result.
+'''
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pyindi.core.defer import DeferChain, Just, wait_await
+from pyindi.core.indi_types import IPS
+
+
+def ok(_):
+    return wait_await(Just(IPS.Ok, "link"))
+
+
+async def setup_cost(nchains=2000, nlinks=5):
+    start = time.perf_counter()
+    chains = []
+    for _ in range(nchains):
+        chain = DeferChain()
+        for _ in range(nlinks):
+            chain.add(ok)
+        chains.append(chain)
+    built = time.perf_counter()
+    for chain in chains:
+        await chain
+    done = time.perf_counter()
+    nn = nchains * nlinks
+    print(f'setup:      {(built - start) / nn * 1e6:8.2f} us/link')
+    print(f'completion: {(done - built) / nn * 1e6:8.2f} us/link')
+
+
+async def latency(nsamples=2000, nlinks=5):
+    loop = asyncio.get_running_loop()
+    samples = []
+    for _ in range(nsamples):
+        trigger = loop.create_future()
+        chain = DeferChain(trigger)
+        for _ in range(nlinks):
+            chain.add(ok)
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        trigger.set_result(Just(IPS.Ok).check())
+        await chain
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    print(f'latency:    {samples[len(samples) // 2] * 1e6:8.2f} us median, '
+          f'{samples[int(len(samples) * 0.99)] * 1e6:8.2f} us p99 '
+          f'({nlinks} links)')
+
+
+async def main():
+    await setup_cost()
+    await latency()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+@File      :   benchmarks/bench_driver_harness.py
+@Time      :   2023/03
+@License   :   MIT
+
+A driver run in process with pyindi.device.harness, no indiserver and
+no client: round trip latency of a synchronous ISNewNumber and of a
+coroutine NewVectorProperty handler, and the output throughput while
+a repeat method streams sets of a large vector.
+'''
+
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pyindi.device import (device, INumberVector, INumber, INumberArrayVector,
+                           IPState, IPerm)
+from pyindi.device.harness import DriverHarness
+
+
+class BenchDevice(device):
+
+    def ISGetProperties(self, device=None):
+        self.IDDef(INumberVector([INumber('VALUE', '%f', 0, 100, 1, 0)],
+                                 self.device, 'SYNC', IPState.IDLE, IPerm.RW))
+        self.IDDef(INumberVector([INumber('VALUE', '%f', 0, 100, 1, 0)],
+                                 self.device, 'ASYNC', IPState.IDLE, IPerm.RW))
+        self.IDDef(INumberArrayVector([f'S{i}' for i in range(200)],
+                                      self.device, 'SENSORS', IPState.OK, IPerm.RO))
+        self.streaming = False
+
+    def ISNewNumber(self, device, name, values, names):
+        self.IUUpdate(device, name, values, names)
+        vec = self.IUFind(name)
+        vec.state = IPState.OK
+        self.IDSet(vec)
+
+    @device.NewVectorProperty('ASYNC')
+    async def new_async(self, device, name, values, names):
+        await asyncio.sleep(0.001)
+        self.IUUpdate(device, name, values, names)
+
+    @device.repeat(1)
+    def stream(self):
+        if self.streaming:
+            sensors = self.IUFind('SENSORS')
+            sensors.values += 1.0
+            self.IDSet(sensors)
+
+
+async def main(ncalls=1000):
+    async with DriverHarness(BenchDevice()) as harness:
+        await harness.get_properties()
+        print(f'{len(harness.properties)} properties defined')
+
+        for name in ('SYNC', 'ASYNC'):
+            for i in range(ncalls):
+                await harness.new(name, {'VALUE': i % 100})
+            lat = harness.stats()['latency'][name]
+            print(f'{name:5s} new -> set: p50 {lat["p50"] * 1e6:7.0f} us '
+                  f'p99 {lat["p99"] * 1e6:7.0f} us')
+
+        dev = harness.dev
+        before = harness.bytes_out, harness.elements_out['setNumberVector']
+        dev.streaming = True
+        await asyncio.sleep(1.0)
+        dev.streaming = False
+        nbytes = harness.bytes_out - before[0]
+        nsets = harness.elements_out['setNumberVector'] - before[1]
+        print(f'streaming: {nsets} sets/s, {nbytes / 2**20:.1f} MB/s, '
+              f'S0 = {harness["SENSORS"]["S0"]:.0f}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
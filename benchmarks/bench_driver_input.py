@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+@File      :   benchmarks/bench_driver_input.py
+@Time      :   2023/03
+@License   :   MIT
+
+Throughput of the driver input path (device.run): multi-line
+newNumberVector messages per second, and the time to receive one large
+newBLOBVector written as 76 character base64 lines. With coalesce_new
+a burst of slider updates for one property reaches the handler once.
+Uploads are generated while they are read, the peak memory of the
+driver should not grow with their size.
+'''
+
+import asyncio
+import base64
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pyindi.device import device
+
+
+class BenchDevice(device):
+
+    def __init__(self, expected):
+        super().__init__()
+        self.expected = expected
+        self.count = 0
+        self.blob_len = 0
+
+    def ISGetProperties(self, device=None):
+        pass
+
+    def ISNewNumber(self, dev, name, values, names):
+        self.done()
+
+    def done(self):
+        self.count += 1
+        if self.count == self.expected:
+            self.running = False
+
+
+@BenchDevice.NewVectorProperty("UPLOAD")
+def new_upload(self, dev, name, values, names):
+    if isinstance(values[0], memoryview):
+        self.blob_len = values[0].nbytes
+    else:
+        self.blob_len = values[0].stat().st_size
+    self.done()
+
+
+def number_message(i, nmembers=5):
+    lines = [f'<newNumberVector device="BenchDevice" name="N{i % 10}">']
+    lines += [f'  <oneNumber name="M{j}">{i + j}.5</oneNumber>' for j in range(nmembers)]
+    lines.append('</newNumberVector>')
+    return '\n'.join(lines) + '\n'
+
+
+class UploadReader:
+    """A newBLOBVector of nbytes random bytes, made while it is read"""
+
+    def __init__(self, nbytes, chunk=3 * 2**16):
+        self.parts = self.generate(nbytes, chunk)
+
+    @staticmethod
+    def generate(nbytes, chunk):
+        yield ('<newBLOBVector device="BenchDevice" name="UPLOAD">\n'
+               f'<oneBLOB name="FILE" size="{nbytes}" format=".bin">\n').encode()
+        for start in range(0, nbytes, chunk):
+            yield base64.encodebytes(os.urandom(min(chunk, nbytes - start)))
+        yield b'</oneBLOB>\n</newBLOBVector>\n'
+
+    async def read(self, n):
+        return next(self.parts, b'')
+
+
+async def feed(payload, expected, coalesce=False):
+    dev = BenchDevice(expected)
+    dev.coalesce_new = coalesce
+    dev.reader = asyncio.StreamReader(limit=2**24)
+    dev.reader.feed_data(payload.encode())
+    dev.reader.feed_eof()
+    dev.running = True
+    start = time.perf_counter()
+    await dev.run()
+    return time.perf_counter() - start, dev
+
+
+async def main(nmessages=10000, blob_mb=(1, 8, 64)):
+    payload = ''.join(number_message(i) for i in range(nmessages))
+    secs, _ = await feed(payload, nmessages)
+    print(f'newNumberVector: {nmessages / secs:10.0f} messages/s')
+
+    burst = ''.join(number_message(i * 10) for i in range(30))
+    for coalesce in (False, True):
+        secs, dev = await feed(burst, 30, coalesce)
+        print(f'30 message burst, coalesce_new={coalesce}: {dev.count} handler calls')
+
+    # two messages on the same line
+    secs, dev = await feed(number_message(0).replace('\n', '') * 2, 2)
+    print(f'two messages on one line: {dev.count} handled')
+
+    for mb in blob_mb:
+        dev = BenchDevice(1)
+        dev.reader = UploadReader(mb * 2**20)
+        dev.running = True
+        tracemalloc.start()
+        start = time.perf_counter()
+        await dev.run()
+        secs = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f'newBLOBVector {mb:4d} MB: {secs:8.3f} s ({dev.blob_len} bytes, '
+              f'peak memory {peak / 2**20:6.1f} MB)')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+@File      :   benchmarks/bench_driver_lookup.py
+@Time      :   2023/03
+@License   :   MIT
+
+Lookups on the driver side: IUFind, member access by name and IUUpdate
+for a driver with many vector properties and many members per vector.
+The time per call should not grow with either count.
+'''
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pyindi.device import device, INumberVector, INumber, IPState, IPerm
+
+
+class BenchDevice(device):
+
+    def ISGetProperties(self, device=None):
+        pass
+
+
+def build(dev, nvectors, nmembers):
+    for v in range(nvectors):
+        np = [INumber(f'M{i}', '%f', 0, 100, 1, i) for i in range(nmembers)]
+        dev.IDDef(INumberVector(np, dev.device, f'V{v}', IPState.OK,
+                                IPerm.RW, group=f'G{v % 10}'))
+    while not dev.outq.empty():
+        dev.outq.get_nowait()
+
+
+def rate(func, ncalls):
+    start = time.perf_counter()
+    for i in range(ncalls):
+        func(i)
+    return ncalls / (time.perf_counter() - start)
+
+
+def main(ncalls=20000):
+    for nvectors, nmembers in ((10, 5), (100, 50), (1000, 500)):
+        dev = BenchDevice()
+        build(dev, nvectors, nmembers)
+        names = [f'M{i}' for i in range(nmembers)]
+
+        def find(i):
+            dev.IUFind(f'V{i % nvectors}')
+
+        def member(i):
+            dev.IUFind(f'V{i % nvectors}')[names[i % nmembers]].value = i
+
+        def update(i):
+            dev.IUUpdate(dev.device, f'V{i % nvectors}', [i, i], names[-2:])
+
+        print(f'{nvectors:4d} vectors x{nmembers:3d} members: '
+              f'IUFind {rate(find, ncalls):9.0f} /s  '
+              f'member {rate(member, ncalls):9.0f} /s  '
+              f'IUUpdate {rate(update, ncalls):9.0f} /s')
+
+
+if __name__ == '__main__':
+    main()
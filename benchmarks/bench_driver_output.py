@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+@File      :   benchmarks/bench_driver_output.py
+@Time      :   2023/03
+@License   :   MIT
+
+Throughput of the driver output path: IDSet calls per second for number,
+switch and text vectors, measured up to the bytes put on device.outq.
+Every call changes one member; "full" forces the whole vector out,
+"delta" sends only the changed member.
+
+The last lines compare a 1000 member INumberVector with an
+INumberArrayVector: updating every member, then IDSet of the update.
+'''
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pyindi.device import (device, INumberVector, INumber, INumberArrayVector,
+                           ISwitchVector, ISwitch, ITextVector, IText,
+                           IPState, IPerm, ISRule)
+
+
+class BenchDevice(device):
+
+    def ISGetProperties(self, device=None):
+        pass
+
+
+def number_vector(nmembers):
+    np = [INumber(f'M{i}', '%f', 0, 100, 1, i) for i in range(nmembers)]
+    return INumberVector(np, 'BenchDevice', 'NUMBERS', IPState.OK, IPerm.RO)
+
+
+def switch_vector(nmembers):
+    sp = [ISwitch(f'S{i}', 'Off') for i in range(nmembers)]
+    return ISwitchVector(sp, 'BenchDevice', 'SWITCHES', IPState.OK,
+                         ISRule.NOFMANY, IPerm.RW)
+
+
+def text_vector(nmembers):
+    tp = [IText(f'T{i}', f'text {i}') for i in range(nmembers)]
+    return ITextVector(tp, 'BenchDevice', 'TEXTS', IPState.OK, IPerm.RO)
+
+
+def bench(dev, vec, update, ncalls, force):
+    start = time.perf_counter()
+    for i in range(ncalls):
+        update(vec, i)
+        dev.IDSet(vec, force=force)
+    secs = time.perf_counter() - start
+    nbytes = 0
+    while not dev.outq.empty():
+        nbytes += len(dev.outq.get_nowait())
+    return ncalls / secs, nbytes / ncalls
+
+
+def update_number(vec, i):
+    vec.np[i % len(vec.np)].value = i
+
+
+def update_switch(vec, i):
+    sw = vec.sp[i % len(vec.sp)]
+    sw.value = 'Off' if sw.value == 'On' else 'On'
+
+
+def update_text(vec, i):
+    vec.tp[i % len(vec.tp)].value = f'text {i}'
+
+
+def main(ncalls=20000):
+    dev = BenchDevice()
+    for label, factory, update in (
+            ('number', number_vector, update_number),
+            ('switch', switch_vector, update_switch),
+            ('text', text_vector, update_text)):
+        for nmembers in (1, 5, 20):
+            for mode, force in (('full', True), ('delta', False)):
+                rate, size = bench(dev, factory(nmembers), update, ncalls, force)
+                print(f'IDSet {label:6s} x{nmembers:2d} {mode:5s}: {rate:10.0f} /s '
+                      f'{size:8.0f} bytes/message')
+
+    bench_arrays()
+
+
+def bench_arrays(nmembers=1000, ncalls=200):
+    import numpy
+
+    dev = BenchDevice()
+    names = [f'M{i}' for i in range(nmembers)]
+    data = numpy.random.default_rng(0).random((ncalls, nmembers))
+    vectors = {
+        'INumberVector': number_vector(nmembers),
+        'INumberArrayVector': INumberArrayVector(
+            names, 'BenchDevice', 'ARRAY', IPState.OK, IPerm.RO),
+        'INumberArrayVector %.6g': INumberArrayVector(
+            names, 'BenchDevice', 'ARRAY6', IPState.OK, IPerm.RO,
+            wire_format='%.6g'),
+    }
+    for label, vec in vectors.items():
+        if isinstance(vec, INumberArrayVector):
+            def update(i):
+                vec.values[:] = data[i]
+        else:
+            def update(i):
+                for prop, value in zip(vec.np, data[i].tolist()):
+                    prop.value = value
+
+        start = time.perf_counter()
+        for i in range(ncalls):
+            update(i)
+        update_us = (time.perf_counter() - start) / ncalls * 1e6
+
+        dev.IDDef(vec)
+        start = time.perf_counter()
+        for i in range(ncalls):
+            update(ncalls - 1 - i)
+            dev.IDSet(vec)
+        set_us = (time.perf_counter() - start) / ncalls * 1e6
+        while not dev.outq.empty():
+            dev.outq.get_nowait()
+
+        print(f'{label:24s} x{nmembers}: update {update_us:8.1f} us '
+              f' update+IDSet {set_us:8.1f} us')
+
+
+if __name__ == '__main__':
+    main()
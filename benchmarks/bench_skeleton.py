@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+@File      :   benchmarks/bench_skeleton.py
+@Time      :   2023/03
+@License   :   MIT
+
+Driver startup from a skeleton file with 500 vector properties: time
+from buildSkeleton to the first def on device.outq. "cold" parses and
+compiles the skeleton, "cached" reads the compiled json next to it,
+"memory" is a second device of the same process.
+'''
+
+import importlib
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pyindi.device import device
+
+# the module, pyindi.device.device is the class
+device_module = importlib.import_module('pyindi.device.device')
+
+
+class BenchDevice(device):
+
+    def ISGetProperties(self, device=None):
+        pass
+
+
+KINDS = (
+    ('Number', 'perm="rw" timeout="0"',
+     'label="N{i}" format="%10.6m" min="0" max="60" step="1"', '3'),
+    ('Switch', 'perm="rw" rule="OneOfMany" timeout="60"', 'label="S{i}"', 'Off'),
+    ('Text', 'perm="rw" timeout="0"', 'label="T{i}"', 'some text'),
+    ('Light', '', 'label="L{i}"', 'Idle'),
+)
+
+
+def write_skeleton(path, nvectors=500, nmembers=4):
+    lines = ['<INDIDriver>']
+    for v in range(nvectors):
+        kind, vattrs, mattrs, value = KINDS[v % len(KINDS)]
+        lines.append(f'<def{kind}Vector device="BenchDevice" name="V{v}" '
+                     f'label="Vector {v}" group="G{v % 10}" state="Idle" {vattrs}>')
+        for i in range(nmembers):
+            lines.append(f'    <def{kind} name="M{i}" {mattrs.format(i=i)}>\n'
+                         f'{value}\n    </def{kind}>')
+        lines.append(f'</def{kind}Vector>')
+    lines.append('</INDIDriver>')
+    Path(path).write_text('\n'.join(lines))
+
+
+def first_def(skelfile):
+    dev = BenchDevice()
+    start = time.perf_counter()
+    dev.buildSkeleton(skelfile)
+    dev.outq.get_nowait()
+    return (time.perf_counter() - start) * 1000, len(dev.props)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        skelfile = Path(tmp) / 'skeleton.xml'
+        write_skeleton(skelfile)
+
+        for label in ('cold', 'cached', 'memory'):
+            if label != 'memory':
+                device_module._skeletons.clear()
+            millis, nprops = first_def(skelfile)
+            print(f'{nprops} properties {label:6s}: first def after {millis:7.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
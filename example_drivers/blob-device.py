@@ -80,7 +80,7 @@ class BLOBDevice(device):
 
         
     @device.NewVectorProperty("img")
-    def new_img(self, device: str, name: str, values: list, names: list):
+    async def new_img(self, device: str, name: str, values: list, names: list):
         """Generate a new image after a fits or jpg switch property is clicked.
 
         Parameters
@@ -95,20 +95,25 @@ class BLOBDevice(device):
             list of names in the indi property
         """
         sw = self.IUFind("img")
+        if not self.blob_wanted("blob"):
+            # no client listens, don't render images for nothing
+            self.IDMessage("BLOBs are disabled, enableBLOB first")
+            return
+
         sw.state = "Alert"
         self.IDSet(sw)
         if "fits" in names:
             self.IDMessage("Generating New FITS Image")
-            self.new_fits()
+            await self.new_fits()
         else:
             self.IDMessage("Generating New JPG Image")
-            self.new_jpg()
+            await self.new_jpg()
 
         sw.state = "Ok"
         self.IDSet(sw)
 
 
-    def new_jpg(self) -> None:
+    async def new_jpg(self) -> None:
         """Generate a new JPG image on switch click and submit with
         IDSetBLOB
         """
@@ -117,36 +122,39 @@ class BLOBDevice(device):
                  https://pillow.readthedocs.io/en/stable/")
             return 
 
-        data = self.build_star_field(15, peak=254, sigma=2)
+        data = await self.build_star_field(15, peak=254, sigma=2)
         jpg = Image.fromarray(data, mode="L")
         jpg.save("img.jpg")
         blob = self.IUFind("blob")
         
-        with open("img.jpg", 'rb') as imgfd:
-            bd = imgfd.read()
-            blob["jpg_blob"] = bd
+        # the file is streamed when the BLOB is sent
+        blob["jpg_blob"] = "img.jpg"
 
         self.IDSetBLOB(blob)
 
 
-    def new_fits(self) -> None:
+    async def new_fits(self) -> None:
         """Generate a new fits on switch click and submit it with IDSetBLOB.
         """
 
         blob = self.IUFind("blob")
-        data = self.build_star_field(15)
+        data = await self.build_star_field(15)
 
         fitsdata = fits.PrimaryHDU(data=data)
         mem = BytesIO()
         fitsdata.writeto(mem)
-        mem.seek(0)
 
-        blob["fits_blob"] = mem.read()
+        # a view of the buffer, no copy
+        blob["fits_blob"] = mem.getbuffer()
         self.IDSetBLOB(blob)
 
 
-    def build_star_field(self, nstars: int, sigma :int=None, peak :int=None) -> np.array:
-        """Use vectorized gauss to build a star field
+    @device.offload(pool="process")
+    def build_star_field(nstars: int, sigma :int=None, peak :int=None) -> np.array:
+        """Use vectorized gauss to build a star field. Like every
+        offloaded function it takes no self; it runs in a worker
+        process and the event loop keeps serving the other
+        properties meanwhile.
 
         Parameters
         ----------
@@ -170,7 +178,7 @@ class BLOBDevice(device):
             if sigma is None:
                 sigma = np.random.randint(1, 5)
                 peak = np.random.randint(1, 32)
-            star = self.gauss(xs, ys, peak, x0, y0, sigma)
+            star = BLOBDevice.gauss(xs, ys, peak, x0, y0, sigma)
             data = data + star
         
         return data.astype("int8")
@@ -216,4 +224,6 @@ async def main():
     BD = BLOBDevice()
     await BD.astart()
 
-asyncio.run(main())
\ No newline at end of file
+# the offload workers import this script again, without running it
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
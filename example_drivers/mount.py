@@ -58,12 +58,9 @@ class mount( INDIDevice.device ):
             values = {key.decode():json.loads(r.get(key).decode())['value'] for key in mkeys}
             nums = self.IUFind(device="mount", name="mount_nums")
 
-            #O(N*N) where N is number of keys :(
-
             for key, value in values.items():
-                for num in nums.np:
-                    if num.name == key:
-                        num.value = value
+                if key in nums:
+                    nums[key] = value
                 
 
             
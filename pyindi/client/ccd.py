@@ -19,6 +19,7 @@ import asyncio
 
 from .device import Device
 from pyindi.core.defer import DeferBase,Just,DeferProperty,DeferResult
+from pyindi.core import trace
 from pyindi.core.indi_types import IPS,ISS
 
 import datetime
@@ -37,17 +38,24 @@ class DeferImage(DeferBase):
 
         self.hdulist = None
 
+        if self.span is not None:
+            self.span.set(property=f'{dev_name}.{sensor_name}')
+            trace.reparent(getattr(fut_exp, 'span', None), self.span)
+            self._trace_on(self.fut_data)
+
     async def wait(self):
         exposure = await self.exp_prop
 
         if exposure.state != IPS.Ok:
-            return DeferResult(IPS.Alert,None,f"abort exposure? {exposure.message}")
+            self.result = DeferResult(IPS.Alert,None,f"abort exposure? {exposure.message}")
+            return self.result
         else:
             self.log.info(f'EXPOSURE COMPLETE:{exposure.message}')
 
         p = await self.fut_data
         if p.state != IPS.Ok:
-            return(IPS.Alert,f"download failure? {p}")
+            self.result = DeferResult(IPS.Alert,None,f"download failure? {p}")
+            return self.result
         else:
             self.log.info(f'DOWNLOAD COMPLETE:{p}')
 
@@ -78,6 +86,9 @@ class DeferImage(DeferBase):
         self.result = DeferResult(IPS.Ok,self.hdulist,'Data ready')
         return self.result
 
+    def pending(self):
+        return [self.exp_prop, self.fut_data]
+
 
 class CCD(Device):
     Frame = Enum('Frame',['LIGHT','BIAS','DARK','FLAT'])
@@ -129,7 +129,7 @@ class INDIConn:
 
         Parameters
         ----------
-        msg : string
+        msg : string or bytes
             The message to send to indiserver
 
         Returns
@@ -137,7 +137,8 @@ class INDIConn:
         None
         """
         # logging.debug('Sending message')
-        msg = msg.encode()
+        if isinstance(msg, str):
+            msg = msg.encode()
         self.writer.write(msg)
         await self.writer.drain()
 
@@ -341,15 +342,15 @@ class INDIClient:
 
         Parameters
         ----------
-        msg : string
-            XML string to send to indiserver
+        msg : string or bytes
+            XML to send to indiserver
 
         Returns
         -------
         None
         """
         if self.is_connected:
-            logging.debug(f"|xml_to_indiserver| {msg}")
+            logging.debug("|xml_to_indiserver| %s", msg)
             try:
                 await self.conn.send_msg(msg)
 
@@ -11,14 +11,21 @@
 '''
 
 from pyindi.core.indi_types import IPS,ISS
-from pyindi.core.defer import Just,DeferProperty
+from pyindi.core.defer import Just,DeferProperty,DeferRetry
 import asyncio
 class Device:
     def __init__(self, gateway, dev_name):
         self.gw = gateway
         self.dev_name = dev_name
 
-    def _defer_prop(self,pname,vec=None):
+    def _defer_prop(self,pname,vec=None,retry=None):
+        """
+        Send vec (if any) and wait for pname to complete. With a RetryPolicy
+        vec is sent again, after a backoff, while the result matches it.
+        """
+        if retry is not None:
+            return DeferRetry(lambda: self._defer_prop(pname, vec), retry)
+
         loop = asyncio.get_running_loop()
         
         obj = None
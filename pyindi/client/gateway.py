@@ -116,7 +116,7 @@ class Gateway(TreeClient):
     async def sendVector(self, vec):
         if (pc := self.__getPC(vec.device, vec.name)) is not None:
             pc.vec.state = IPS.Busy
-        xml = vec.to_xml()
+        xml = vec.to_bytes()
         await self.xml_to_indiserver(xml)
         return DeferResult(IPS.Ok, vec, "vec sent")
 
@@ -16,6 +16,7 @@ from astropy.wcs import WCS
 from uuid import uuid4
 from asyncio.subprocess import PIPE
 from pyindi.core.defer import *
+from pyindi.core import trace
 import numpy as np
 import logging
 import asyncio
@@ -195,7 +196,10 @@ class DeferSEx(DeferBase):
                 if out_eof and err_eof:
                     break
 
-        self.sub_chain = DeferChain()
+        if self.span is not None:
+            self.span.set(uu=self.uu)
+        with trace.use(self.span):
+            self.sub_chain = DeferChain()
         self.sub_chain.add(lambda _: wait_await(create_subprocess()))
         self.sub_chain.add(lambda _: wait_await(stream_read()))
 
@@ -206,9 +210,20 @@ class DeferSEx(DeferBase):
 
     async def wait(self):
         await self.sub_chain
-        self.rc = await self.proc.wait()
+        if self.proc is not None:
+            self.rc = await self.proc.wait()
         return self.check()
 
+    def cancel(self, message="cancelled"):
+        if not super().cancel(message):
+            return False
+        if self.proc is not None and self.proc.returncode is None:
+            self.proc.kill()
+        return True
+
+    def pending(self):
+        return [self.sub_chain]
+
     def check(self):
         if self.result is not None:
             return self.result
@@ -283,7 +298,10 @@ class DeferAstrometry(DeferBase):
                 if out_eof and err_eof:
                     break
 
-        self.sub_chain = DeferChain()
+        if self.span is not None:
+            self.span.set(uu=uu)
+        with trace.use(self.span):
+            self.sub_chain = DeferChain()
         self.sub_chain.add(lambda _: wait_await(create_subprocess()))
         self.sub_chain.add(lambda _: wait_await(stream_read()))
 
@@ -297,9 +315,20 @@ class DeferAstrometry(DeferBase):
 
     async def wait(self):
         await self.sub_chain
-        self.rc = await self.proc.wait()
+        if self.proc is not None:
+            self.rc = await self.proc.wait()
         return self.check()
 
+    def cancel(self, message="cancelled"):
+        if not super().cancel(message):
+            return False
+        if self.proc is not None and self.proc.returncode is None:
+            self.proc.kill()
+        return True
+
+    def pending(self):
+        return [self.sub_chain]
+
     def check(self):
         if self.result is not None:
             return self.result
@@ -72,11 +72,16 @@ class PropertyControl:
         loop = asyncio.get_event_loop()
         f = loop.create_future()
         self.futures.append(f)
+        f.add_done_callback(self.__discard_cancelled)
         if not isinstance(self.vec,BLOBVectorProperty) and self.vec.state != IPS.Busy:
             f.set_result(self.vec)
             self.log.debug(f'get already done future {f} for vec {self.vec}')
         return f
 
+    def __discard_cancelled(self,f):
+        if f.cancelled() and f in self.futures:
+            self.futures.remove(f)
+
     def register_callback(self,callback,once=False):
         key = uuid4().hex
         if once:
@@ -14,8 +14,11 @@
 import asyncio
 from abc import ABC, abstractmethod
 import logging
+import random
 from .indi_types import IPS
-from collections import namedtuple
+from . import trace
+from collections import namedtuple, deque
+import functools
 
 
 async def wait_await(obj):
@@ -38,11 +41,43 @@ async def continue_not_alert(fut, callback,*args,**kwargs):
 DeferResult = namedtuple('DeferResult','state data message',defaults=[IPS.Idle,None,''])
 
 class DeferBase(ABC):
+    traced = True
+
     def __init__(self) -> None:
         super().__init__()
         loop = asyncio.get_event_loop()
         self.log = logging.getLogger('Defer')
+        self.span = trace.start_span(self.__class__.__name__) if self.traced else None
         self.result = None
+        self._cancelled = False
+
+    @property
+    def result(self):
+        return self._result
+
+    @result.setter
+    def result(self, value):
+        # the span of a defer ends with its first result
+        self._result = value
+        if value is not None and self.span is not None:
+            self.span.finish(value)
+            self.span = None
+
+    def _trace_on(self, fut):
+        """end the span as soon as fut completes, not when checked"""
+        if fut is not None and self.span not in (None, trace.NOT_SAMPLED):
+            fut.add_done_callback(self.__trace_done)
+
+    def __trace_done(self, _):
+        if self.span is None:
+            return
+        try:
+            res = self.check()
+        except Exception as error:
+            res = DeferResult(IPS.Alert, None, repr(error))
+        if self.span is not None and getattr(res, 'state', None) != IPS.Busy:
+            self.span.finish(res)
+            self.span = None
 
     @abstractmethod
     async def wait(self):
@@ -52,10 +87,50 @@ class DeferBase(ABC):
     def check(self):
         return DeferResult(IPS.Alert,None, "Error: Absctract class")
 
+    def pending(self):
+        """futures, tasks or defers to cancel together with this object"""
+        return []
+
+    def indi_timeout(self):
+        """INDI timeout [s] of the property behind this object, if any"""
+        return None
+
+    def cancel(self, message="cancelled"):
+        """
+        Stop waiting: the result becomes Alert and everything returned by
+        pending() is cancelled, down to the futures held by PropertyControl.
+        Commands already sent to the driver are not undone.
+        Returns False if the operation had already completed.
+        """
+        if self.done():
+            return False
+        self._cancelled = True
+        self.result = DeferResult(IPS.Alert, None, message)
+        for obj in self.pending():
+            if obj is not None:
+                obj.cancel()
+        return True
+
+    def cancelled(self):
+        return self._cancelled
+
+    def done(self):
+        return self.result is not None or self.check().state != IPS.Busy
+
+    async def _wait_or_cancelled(self):
+        try:
+            return await self.wait()
+        except asyncio.CancelledError:
+            if not self._cancelled:
+                raise
+            return self.result
+
     def __await__(self):
-        return self.wait().__await__()
+        return self._wait_or_cancelled().__await__()
 
 class Just(DeferBase):
+    traced = False
+
     def __init__(self, state, error="", data=None):
         super().__init__()
         self.log = logging.getLogger('Just')
@@ -81,8 +156,12 @@ class DeferProperty(DeferBase):
         self.step_1 = None
         self.step_2 = None
 
+        if self.span is not None:
+            self.span.set(property=f'{dev_name}.{prop_name}')
+
         if step0 is None:
             self.step_2 = self.gateway.getFuture(self.dev_name, self.prop_name)
+            self._trace_on(self.step_2)
 
             self.step_0 = loop.create_future()
             self.step_1 = loop.create_future()
@@ -95,12 +174,26 @@ class DeferProperty(DeferBase):
             self.step_0.add_done_callback(lambda _: self.__switch_future())
 
     def __switch_future(self):
+        if self.step_1.done():
+            return
+        if self.span is not None:
+            self.span.mark('sent')
         self.step_2 = self.gateway.getFuture(self.dev_name, self.prop_name)
+        self._trace_on(self.step_2)
         self.step_1.set_result(True)
 
+    def pending(self):
+        return [self.step_1, self.step_2]
+
+    def indi_timeout(self):
+        if (vec := self.gateway.getVector(self.dev_name, self.prop_name)) is None:
+            return None
+        return vec.timeout or None
+
     async def wait(self):
-        await self.step_0
         await self.step_1
+        # re-raise errors of the triggering task
+        self.step_0.result()
         await self.step_2
 
         return self.check()
@@ -125,87 +218,381 @@ class DeferProperty(DeferBase):
     def __repr__(self) -> str:
         return f'DeferProperty("{self.dev_name}"."{self.prop_name}" = {self.prop})'
 
-     
-class DeferAction(DeferBase):
-    def __init__(self, step0,action) -> None:
+
+class _Resolved:
+    """Completed-future stand-in handed to the actions of a DeferChain."""
+    __slots__ = ('_result',)
+
+    def __init__(self, result):
+        self._result = result
+
+    def result(self):
+        return self._result
+
+    def exception(self):
+        return None
+
+    def done(self):
+        return True
+
+    def cancelled(self):
+        return False
+
+
+class DeferChain(DeferBase):
+    """
+    Sequence of actions run by a single task. Each action is called with
+    a completed future holding the previous result and must return an
+    awaitable; links are dropped as soon as they complete.
+    """
+    def __init__(self,first=None) -> None:
         super().__init__()
+        self.log = logging.getLogger('DeferChain')
+
+        self.links = deque()
+        self.task = None
+        self.head = first
+        self.last = DeferResult(IPS.Ok, None, "chain begin")
+        trace.reparent(getattr(first, 'span', None), self.span)
+
+        if first is not None:
+            self.__start()
+
+    def __start(self):
         loop = asyncio.get_event_loop()
-        self.log = logging.getLogger('DeferAction')
+        self.task = loop.create_task(self.__run())
+        self._trace_on(self.task)
+
+    async def __run(self):
+        # defers created by the actions are nested under this chain
+        if self.span is not None:
+            trace.current_span.set(self.span)
+        if self.head is not None:
+            self.last = await self.head
+        while self.links and not self._cancelled:
+            action = self.links.popleft()
+            self.head = action(_Resolved(self.last))
+            self.last = await self.head
+        self.head = None
+        return self.last
+
+    def add(self,action,retry=None):
+        """
+        Append action to the chain. With a RetryPolicy the action is
+        called again, after a backoff, while its result matches the policy.
+        """
+        if self._cancelled:
+            self.log.debug(f'chain cancelled, {action} not added')
+            return
+        if retry is not None:
+            action = functools.partial(_retry_action, action, retry)
+        self.result = None
+        self.links.append(action)
+        if self.task is None or self.task.done():
+            self.__start()
 
-        self.step_0 = loop.create_task(wait_await(step0))
+    def link_ok(self,callback,*args,**kwargs):
+        self.add(lambda x: continue_if_ok(x,callback,*args,**kwargs))
 
-        self.action = action
+    def link_not_alert(self,callback,*args,**kwargs):
+        self.add(lambda x: continue_not_alert(x,callback,*args,**kwargs))
 
-        self.step_1 = loop.create_future()
-        self.step_2 = None
+    async def wait(self):
+        # links added while waiting may have started a new task
+        while (task := self.task) is not None:
+            await asyncio.shield(task)
+            if task is self.task:
+                break
+        return self.check()
+
+    def check(self):
+        if self.result is not None:
+            return self.result
+
+        if self.task is None:
+            self.result = self.last
+            return self.result
+
+        if not self.task.done():
+            if isinstance(self.head, DeferBase):
+                res = self.head.check()
+                if res.state == IPS.Busy:
+                    return res
+            return DeferResult(IPS.Busy, None,
+                               f"Waiting for {len(self.links) + 1} links to complete")
+        if self.task.cancelled():
+            return DeferResult(IPS.Alert,None, "Future cancelled, maybe device has crashed")
+
+        self.result = self.task.result()
+        self.log.debug(f'check()->{self.result}')
+        return self.result
+
+    def done(self):
+        return self.task is None or self.task.done()
+
+    def pending(self):
+        if isinstance(self.head, DeferBase):
+            return [self.head, self.task]
+        return [self.task]
 
-        self.step_0.add_done_callback(lambda x: self.__run(x))
+
+class DeferAction(DeferChain):
+    """Run action once step0 has completed, a chain with a single link."""
+    def __init__(self, step0,action) -> None:
+        super().__init__(step0)
+        self.log = logging.getLogger('DeferAction')
+        self.add(action)
 
     @classmethod
     def create_task(cls,awaitable,action,*args):
         return cls(awaitable,lambda x : continue_if_ok(x,action,*args))
 
-    def __run(self, res):
-        self.log.debug(f'step0: {res.result()}')
-        loop = asyncio.get_event_loop()
-        self.step_2 = loop.create_task(self.action(res))
-        self.step_1.set_result(True)
+
+class DeferGroup(DeferBase):
+    """
+    Wait for all the defers, which are already running concurrently.
+    The result is Ok only if every member ends Ok, its data is the list
+    of member results. With fail_fast the first Alert cancels the others.
+    """
+    def __init__(self, *defers, fail_fast=False) -> None:
+        super().__init__()
+        self.log = logging.getLogger('DeferGroup')
+        self.defers = list(defers)
+        self.fail_fast = fail_fast
+        for d in self.defers:
+            trace.reparent(d.span, self.span)
 
     async def wait(self):
-        await self.step_0
-        await self.step_1
-        await self.step_2
+        tasks = [asyncio.ensure_future(wait_await(d)) for d in self.defers]
+        for t in asyncio.as_completed(tasks):
+            res = await t
+            if self.fail_fast and res.state == IPS.Alert:
+                self.check()
         return self.check()
-    
 
     def check(self):
         if self.result is not None:
             return self.result
 
-        if not self.step_0.done():
-            return DeferResult(IPS.Busy,None, "Waiting for triggering event to complete")
-        if not self.step_1.done():
-            return DeferResult(IPS.Busy,None, "Waiting for action setup")
-        if not self.step_2.done():
-            return DeferResult(IPS.Busy,None, "Waiting for action to complete")
-        if self.step_2.cancelled():
-            return DeferResult(IPS.Alert,None, "Future cancelled, maybe device has crashed")
+        results = [d.check() for d in self.defers]
+        busy = sum(r.state == IPS.Busy for r in results)
+        failed = sum(r.state != IPS.Ok and r.state != IPS.Busy for r in results)
 
-        self.result = self.step_2.result()
-        self.log.debug(f'check()->{self.result}')
+        if failed and self.fail_fast and busy:
+            for d in self.defers:
+                d.cancel("cancelled by failure in group")
+            results = [d.check() for d in self.defers]
+        elif busy:
+            return DeferResult(IPS.Busy, results, f"{busy} of {len(results)} still running")
+
+        if failed:
+            self.result = DeferResult(IPS.Alert, results, f"{failed} of {len(results)} failed")
+        else:
+            self.result = DeferResult(IPS.Ok, results, "all completed")
         return self.result
-        
-    
 
-class DeferChain(DeferBase):
-    def __init__(self,first=None) -> None:
+    def pending(self):
+        return self.defers
+
+    def indi_timeout(self):
+        timeouts = [d.indi_timeout() for d in self.defers]
+        if None in timeouts or len(timeouts) == 0:
+            return None
+        return max(timeouts)
+
+
+class DeferRace(DeferBase):
+    """
+    Complete with the result of the first defer to complete, whatever
+    its state, and cancel the others. The winner is kept in self.winner.
+    """
+    def __init__(self, *defers) -> None:
         super().__init__()
-        self.log = logging.getLogger('DeferChain')
+        self.log = logging.getLogger('DeferRace')
+        self.defers = list(defers)
+        self.winner = None
+        for d in self.defers:
+            trace.reparent(d.span, self.span)
 
-        b = first
-        if b is None:
-            b = Just(IPS.Ok,"chain begin")
-        self.future_links = [b]
+    async def wait(self):
+        tasks = [asyncio.ensure_future(wait_await(d)) for d in self.defers]
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        # the losers are cancelled here, their tasks then end by themselves
+        return self.check()
 
-    def add(self,action):
-        self.result = None
-        a =  DeferAction(self.future_links[-1],action)
-        self.future_links.append(a)
+    def check(self):
+        if self.result is not None:
+            return self.result
 
-    def link_ok(self,callback,*args,**kwargs):
-        self.add(lambda x: continue_if_ok(x,callback,*args,**kwargs))
+        for d in self.defers:
+            res = d.check()
+            if res.state != IPS.Busy:
+                self.winner = d
+                self.result = res
+                for other in self.defers:
+                    if other is not d:
+                        other.cancel("lost the race")
+                return self.result
+
+        return DeferResult(IPS.Busy, None, "Waiting for the first to complete")
+
+    def pending(self):
+        return self.defers
+
+
+class DeferTimeout(DeferBase):
+    """
+    Cancel the wrapped defer if it has not completed within timeout
+    seconds. The timeout defaults to the INDI timeout attribute of the
+    property behind the defer; with neither, it never expires.
+    """
+    def __init__(self, defer, timeout=None) -> None:
+        super().__init__()
+        self.log = logging.getLogger('DeferTimeout')
+        self.defer = defer
+        trace.reparent(defer.span, self.span)
+        self.timeout = defer.indi_timeout() if timeout is None else timeout
+        self.handle = None
 
-    def link_not_alert(self,callback,*args,**kwargs):
-        self.add(lambda x: continue_not_alert(x,callback,*args,**kwargs))
+        if self.timeout:
+            loop = asyncio.get_event_loop()
+            self.handle = loop.call_later(self.timeout, self.__expire)
+
+    def __expire(self):
+        if self.defer.cancel(f"timeout after {self.timeout}s"):
+            self.log.warning(f'{self.defer} timed out after {self.timeout}s')
 
     async def wait(self):
-        self.result =  await self.future_links[-1]
-        return self.result
+        await self.defer
+        return self.check()
 
     def check(self):
         if self.result is not None:
             return self.result
-        return self.future_links[-1].check()
 
-    
+        res = self.defer.check()
+        if res.state != IPS.Busy:
+            if self.handle is not None:
+                self.handle.cancel()
+            self.result = res
+        return res
+
+    def pending(self):
+        return [self.defer, self.handle]
+
+    def indi_timeout(self):
+        return self.timeout or None
+
+
+class RetryPolicy:
+    """
+    How DeferRetry repeats a failing operation.
+
+    * attempts: maximum number of attempts, the first one included
+    * backoff: delay [s] before the first retry, multiplied by factor at
+      every further retry and capped to max_backoff
+    * jitter: fraction of the delay that is randomized, so that several
+      clients do not retry in lockstep
+    * deadline: overall time [s] after which the operation is cancelled
+    * retry_on: predicate over the DeferResult, by default any Alert
+    """
+    def __init__(self, attempts=3, backoff=1.0, factor=2.0, max_backoff=30.0,
+                 jitter=0.5, deadline=None, retry_on=None) -> None:
+        self.attempts = attempts
+        self.backoff = backoff
+        self.factor = factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.deadline = deadline
+        self.retry_on = retry_on if retry_on is not None else lambda res: res.state == IPS.Alert
+
+    def delay(self, attempt):
+        """delay [s] after the given (1 based) failed attempt"""
+        base = min(self.max_backoff, self.backoff * self.factor ** (attempt - 1))
+        return base * (1 - self.jitter * random.random())
+
+
+class DeferRetry(DeferBase):
+    """
+    Call factory, which must return a defer or another awaitable, until
+    its result no longer matches policy.retry_on, the attempts are used
+    up or the deadline expires. Each attempt is a child span of this one.
+    """
+    def __init__(self, factory, policy: RetryPolicy) -> None:
+        super().__init__()
+        self.log = logging.getLogger('DeferRetry')
+        self.factory = factory
+        self.policy = policy
+        self.attempt = 0
+        self.current = None
+        self.handle = None
+
+        loop = asyncio.get_event_loop()
+        if policy.deadline:
+            self.handle = loop.call_later(policy.deadline, self.__expire)
+        self.task = loop.create_task(self.__run())
+        self._trace_on(self.task)
+
+    def __expire(self):
+        self.cancel(f"deadline of {self.policy.deadline}s exceeded after {self.attempt} attempts")
+
+    async def __run(self):
+        if self.span is not None:
+            trace.current_span.set(self.span)
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+
+        while True:
+            self.attempt += 1
+            self.current = self.factory()
+            res = await self.current
+            self.current = None
+
+            if self.span is not None:
+                self.span.set(attempts=self.attempt)
+            if self._cancelled or not self.policy.retry_on(res):
+                return res
+            if self.attempt >= self.policy.attempts:
+                self.log.warning(f'giving up after {self.attempt} attempts: {res.message}')
+                return res
+
+            delay = self.policy.delay(self.attempt)
+            if self.policy.deadline and loop.time() - start + delay > self.policy.deadline:
+                return res
+
+            self.log.info(f'attempt {self.attempt} failed ({res.message}), '
+                          f'retrying in {delay:.2f}s')
+            await asyncio.sleep(delay)
+
+    async def wait(self):
+        await asyncio.shield(self.task)
+        return self.check()
+
+    def check(self):
+        if self.result is not None:
+            return self.result
+
+        if not self.task.done():
+            if isinstance(self.current, DeferBase):
+                res = self.current.check()
+                return DeferResult(IPS.Busy, res.data, f"attempt {self.attempt}: {res.message}")
+            return DeferResult(IPS.Busy, None, f"waiting to retry, {self.attempt} attempts done")
+        if self.task.cancelled():
+            return DeferResult(IPS.Alert,None, "Future cancelled, maybe device has crashed")
+
+        if self.handle is not None:
+            self.handle.cancel()
+        self.result = self.task.result()
+        return self.result
+
+    def done(self):
+        return self.task.done()
+
+    def pending(self):
+        if isinstance(self.current, DeferBase):
+            return [self.current, self.task, self.handle]
+        return [self.task, self.handle]
+
 
+def _retry_action(action, policy, fut):
+    return DeferRetry(lambda: action(fut), policy)
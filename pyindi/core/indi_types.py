@@ -13,9 +13,12 @@
 
 from enum import Enum
 from collections import OrderedDict
+from xml.sax.saxutils import escape, quoteattr
 import datetime
 import base64
 import io
+import time
+import zlib
 
 IPS = Enum('IPS',{'Idle':'Idle','Ok':'Ok','Busy':'Busy','Alert':'Alert'})
 ISS = Enum('ISS',{'Off':'Off','On':'On'})
@@ -40,6 +43,20 @@ class INTERFACE(Enum):
     AUX           = (1 << 15)
     SENSOR        = SPECTROGRAPH | DETECTOR | CORRELATOR
 
+
+_ts_cache = [None, '']
+
+
+def timestamp_now() -> str:
+    '''INDI timestamp with milliseconds, the date and time are formatted once per second.'''
+    now = time.time()
+    sec = int(now)
+    if _ts_cache[0] != sec:
+        _ts_cache[0] = sec
+        _ts_cache[1] = datetime.datetime.fromtimestamp(sec).isoformat()
+    return f'{_ts_cache[1]}.{int((now - sec) * 1000):03d}'
+
+
 class VectorProperty:
     def __init__(self) -> None:
         self.tag_vec = ''
@@ -50,6 +67,7 @@ class VectorProperty:
         self.timestamp = None
         self.timeout = 0
         self.items = OrderedDict()
+        self._xml_cache = None
 
     def __repr__(self) -> str:
         return f'<{self.device}.{self.name}>{{{self.state} [{self.child_str()}]}}'
@@ -64,16 +82,50 @@ class VectorProperty:
         if ele.attrib.get('timeout') is not None:
             self.timeout = int(ele.attrib['timeout'])
 
+    def xml_template(self):
+        '''
+        Return the cached (head, child_heads, child_close, tail) strings used
+        by to_xml. The template is rebuilt only when the tag, device, name or
+        member names change, so escaping is paid once per vector.
+        '''
+        key = (self.tag_vec, self.device, self.name, tuple(self.items))
+        if self._xml_cache is None or self._xml_cache[0] != key:
+            tag = 'new'+self.tag_vec[3:]
+            head = f'<{tag} device={quoteattr(self.device)} name={quoteattr(self.name)} timestamp="'
+            child_heads = [f'<{self.tag_ch} name={quoteattr(k)}>' for k in self.items]
+            strings = (head, child_heads, f'</{self.tag_ch}>', f'</{tag}>')
+            encoded = (head.encode(), [ch.encode() for ch in child_heads],
+                       strings[2].encode(), strings[3].encode())
+            self._xml_cache = (key, strings, encoded)
+        return self._xml_cache[1]
+
+    def bytes_template(self):
+        '''Same as xml_template, encoded once for to_bytes.'''
+        self.xml_template()
+        return self._xml_cache[2]
 
     def to_xml(self) -> str:
-        tag = 'new'+self.tag_vec[3:]
-        now = datetime.datetime.now().isoformat()
-        xml = f'<{tag} device="{self.device}" name="{self.name}" timestamp="{now}">'
-        xml += self.to_xml_child()
-        xml += f'</{tag}>'
-        return xml
+        head, _, _, tail = self.xml_template()
+        return ''.join((head, timestamp_now(), '">', self.to_xml_child(), tail))
+
+    def to_bytes(self) -> bytes:
+        '''Same as to_xml, joined from the encoded templates, ready for the transport.'''
+        head, _, _, tail = self.bytes_template()
+        return b''.join((head, timestamp_now().encode(), b'">', self.to_bytes_child(), tail))
+
+    def to_bytes_child(self) -> bytes:
+        _, child_heads, close, _ = self.bytes_template()
+        value = self.child_value
+        return b''.join([b'%s%s%s' % (ch, value(v).encode(), close)
+                         for ch, v in zip(child_heads, self.items.values())])
 
     def to_xml_child(self) -> str:
+        _, child_heads, close, _ = self.xml_template()
+        value = self.child_value
+        return ''.join([f'{ch}{value(v)}{close}'
+                        for ch, v in zip(child_heads, self.items.values())])
+
+    def child_value(self, v) -> str:
         return ''
 
     def child_str(self) -> str:
@@ -94,10 +146,14 @@ class NumberVectorProperty(VectorProperty):
             self.items[child.attrib['name']] = float(s.strip())
 
     def to_xml_child(self) -> str:
-        xml = ''
-        for k,v in self.items.items():
-            xml += f'<{self.tag_ch} name="{k}">{v:.10f}</{self.tag_ch}>'
-        return xml
+        _, child_heads, close, _ = self.xml_template()
+        return ''.join([f'{ch}{v:.10f}{close}'
+                        for ch, v in zip(child_heads, self.items.values())])
+
+    def to_bytes_child(self) -> bytes:
+        _, child_heads, close, _ = self.bytes_template()
+        return b''.join([b'%s%.10f%s' % (ch, v, close)
+                         for ch, v in zip(child_heads, self.items.values())])
 
     def child_str(self) -> str:
         s = ''
@@ -118,11 +174,8 @@ class SwitchVectorProperty(VectorProperty):
             s = child.text.read()
             self.items[child.attrib['name']] = ISS[s.strip()]
 
-    def to_xml_child(self) -> str:
-        xml = ''
-        for k,v in self.items.items():
-            xml += f'<{self.tag_ch} name="{k}">{v.value}</{self.tag_ch}>'
-        return xml
+    def child_value(self, v) -> str:
+        return v.value
 
     def child_str(self) -> str:
         s = ''
@@ -146,11 +199,8 @@ class TextVectorProperty(VectorProperty):
                 s = child.text.read()                
                 self.items[child.attrib['name']] = s.strip()
 
-    def to_xml_child(self) -> str:
-        xml = ''
-        for k,v in self.items.items():
-            xml += f'<{self.tag_ch} name="{k}">{v}</{self.tag_ch}>'
-        return xml
+    def child_value(self, v) -> str:
+        return '' if v is None else escape(str(v))
 
     def child_str(self) -> str:
         s = ''
@@ -175,6 +225,9 @@ class LightVectorProperty(VectorProperty):
         # we cannot write Lights...
         return ''
 
+    def to_bytes(self) -> bytes:
+        return b''
+
     def child_str(self) -> str:
         s = ''
         for k,v in self.items.items():
@@ -190,26 +243,44 @@ class BLOBVectorProperty(VectorProperty):
     def from_xml(self, ele):
         super().from_xml(ele)
         for child in ele: 
+            fmt = child.attrib.get('format','.dat')
+            compressed = fmt.endswith('.z')
             data = io.BytesIO()
             if child.text is not  None:
                 child.text.seek(0)
-                data.write(base64.b64decode(child.text.read()))
+                decode_blob(child.text, data, compressed)
                 data.seek(0)
-               
+
+            # .z payloads are handed out decompressed
             self.items[child.attrib['name']] = {
                 'size':int(child.attrib.get('size','0')),
-                'format':child.attrib.get('format','.dat'),
+                'format':fmt[:-2] if compressed else fmt,
                 'data':data
             }
             
     def to_xml_child(self) -> str:
-        xml = ''
-        for k,i in self.items.items():
+        _, child_heads, close, _ = self.xml_template()
+        parts = []
+        for ch, i in zip(child_heads, self.items.values()):
             d = i['data']
             d.seek(0)
-            data64 = base64.b64encode(d.read())
-            xml += f'<{self.tag_ch} name="{k}" size="{i["size"]}" format="{i["format"]}">{data64}</{self.tag_ch}>'
-        return xml
+            data64 = base64.b64encode(d.read()).decode('ascii')
+            parts.append(f'{ch[:-1]} size="{i["size"]}" format={quoteattr(i["format"])}>'
+                         f'{data64}{close}')
+        return ''.join(parts)
+
+    def to_bytes_child(self) -> bytes:
+        _, child_heads, close, _ = self.bytes_template()
+        parts = []
+        for ch, i in zip(child_heads, self.items.values()):
+            d = i['data']
+            d.seek(0)
+            parts.append(b'%s size="%d" format=%s>' % (
+                ch[:-1], i['size'], quoteattr(i['format']).encode()))
+            # the base64 stays bytes, no decode and encode again
+            parts.append(base64.b64encode(d.read()))
+            parts.append(close)
+        return b''.join(parts)
 
     def child_str(self) -> str:
         s = ''
@@ -217,6 +288,29 @@ class BLOBVectorProperty(VectorProperty):
             s += f'{k}:{i["size"]}bytes, '
         return s
 
+
+def decode_blob(text, out, compressed=False, chunk_size=2**20):
+    """
+    base64 decode the text stream into the out stream, chunk_size
+    characters at a time, inflating zlib data on the fly when
+    compressed.
+    """
+    inflate = zlib.decompressobj() if compressed else None
+    carry = ''
+    while (piece := text.read(chunk_size)):
+        # base64 may be split in lines, decode whole 4 char groups only
+        piece = carry + ''.join(piece.split())
+        end = len(piece) - len(piece) % 4
+        carry = piece[end:]
+        raw = base64.b64decode(piece[:end])
+        out.write(inflate.decompress(raw) if inflate else raw)
+    if carry:
+        raw = base64.b64decode(carry)
+        out.write(inflate.decompress(raw) if inflate else raw)
+    if inflate:
+        out.write(inflate.flush())
+
+
 def vector_factory(ele) -> VectorProperty:
     vec = None
     name = ele.tag[3:]
@@ -0,0 +1,27 @@
+import io
+import re
+
+from pyindi.core.indi_types import (NumberVectorProperty, SwitchVectorProperty,
+                                    TextVectorProperty, BLOBVectorProperty, ISS)
+
+
+def without_timestamp(xml):
+    return re.sub(rb'timestamp="[^"]*"', b'', xml)
+
+
+def test_to_bytes_is_to_xml_encoded():
+    number = NumberVectorProperty()
+    number.device, number.name = 'D&', 'N"'
+    number.items.update(a=1.5, b=-2e-3)
+    switch = SwitchVectorProperty()
+    switch.device, switch.name = 'D', 'S'
+    switch.items.update(ON=ISS.On, OFF=ISS.Off)
+    text = TextVectorProperty()
+    text.device, text.name = 'D', 'T'
+    text.items.update(x='a<b & "c" é', y=None)
+    blob = BLOBVectorProperty()
+    blob.device, blob.name = 'D', 'B'
+    blob.items['img'] = {'size': 5, 'format': '.fits', 'data': io.BytesIO(b'hello')}
+
+    for vec in (number, switch, text, blob):
+        assert without_timestamp(vec.to_bytes()) == without_timestamp(vec.to_xml().encode())
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+@File      :   pyindi/core/trace.py
+@Time      :   2023/03
+@Author    :   Stefano Sartor
+@Version   :   0.1
+@Contact   :   sartor@oavda.it
+@License   :   MIT
+@Copyright :   (C) 2023 FONDAZIONE CLÉMENT FILLIETROZ-ONLUS
+'''
+
+# Span tracing for the Defer framework.
+#
+# Spans are written as JSON-lines, one Chrome trace event ("ph": "X")
+# per line. to_chrome() turns a file into the JSON that chrome://tracing
+# and Perfetto load.
+#
+# Tracing is off until configure() is called or PYINDI_TRACE is set to
+# the output path. Sampling is decided once per root span, children
+# follow the decision of their parent.
+
+import contextvars
+from contextlib import contextmanager
+import itertools
+import json
+import logging
+import os
+import random
+import time
+
+TRACE_ENV = 'PYINDI_TRACE'
+TRACE_SAMPLE_ENV = 'PYINDI_TRACE_SAMPLE'
+
+current_span = contextvars.ContextVar('pyindi_span', default=None)
+
+
+class Span:
+    __slots__ = ('tracer', 'name', 'span_id', 'parent_id', 'root_id', 'start', 'args')
+
+    def __init__(self, tracer, name, parent, args):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = next(tracer.ids)
+        self.parent_id = None if parent is None else parent.span_id
+        self.root_id = self.span_id if parent is None else parent.root_id
+        self.args = args
+        self.start = time.monotonic_ns()
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def mark(self, event):
+        """record the time elapsed since the start of the span"""
+        self.args[f'{event}_us'] = (time.monotonic_ns() - self.start) // 1000
+
+    def finish(self, result=None):
+        end = time.monotonic_ns()
+        if result is not None:
+            state = getattr(result, 'state', None)
+            self.args['state'] = getattr(state, 'value', state)
+            if (message := getattr(result, 'message', None)):
+                self.args['message'] = message
+        self.tracer.export(self, end)
+
+
+class _NotSampled:
+    """Returned instead of a Span when the root span was not sampled."""
+    span_id = None
+    root_id = None
+
+    def set(self, **args):
+        pass
+
+    def mark(self, event):
+        pass
+
+    def finish(self, result=None):
+        pass
+
+
+NOT_SAMPLED = _NotSampled()
+
+
+class Tracer:
+    def __init__(self) -> None:
+        self.log = logging.getLogger('Tracer')
+        self.enabled = False
+        self.sample_rate = 1.0
+        self.fd = None
+        self.ids = itertools.count(1)
+        self.pid = os.getpid()
+
+    def open(self, path, sample_rate=1.0):
+        self.close()
+        self.fd = open(path, 'a')
+        self.sample_rate = sample_rate
+        self.enabled = True
+
+    def close(self):
+        self.enabled = False
+        if self.fd is not None:
+            self.fd.close()
+            self.fd = None
+
+    def start_span(self, name, **args):
+        if not self.enabled:
+            return None
+
+        parent = current_span.get()
+        if parent is NOT_SAMPLED:
+            return NOT_SAMPLED
+        if parent is None and random.random() >= self.sample_rate:
+            return NOT_SAMPLED
+        return Span(self, name, parent, args)
+
+    def export(self, span, end):
+        if self.fd is None:
+            return
+        args = span.args
+        args['id'] = span.span_id
+        if span.parent_id is not None:
+            args['parent'] = span.parent_id
+
+        event = {
+            'name': span.name,
+            'cat': 'defer',
+            'ph': 'X',
+            'ts': span.start // 1000,
+            'dur': (end - span.start) // 1000,
+            'pid': self.pid,
+            'tid': span.root_id,
+            'args': args,
+        }
+        try:
+            self.fd.write(json.dumps(event, default=str) + '\n')
+            if span.parent_id is None:
+                self.fd.flush()
+        except Exception as error:
+            self.log.error(f'cannot export span {span.name}: {error}')
+
+
+tracer = Tracer()
+
+
+def configure(path, sample_rate=1.0):
+    """write spans to path, keeping a sample_rate fraction of the root spans"""
+    tracer.open(path, sample_rate)
+
+
+def to_chrome(path, output):
+    """write the spans of the JSON-lines file path as a chrome trace"""
+    with open(path) as fd:
+        events = [json.loads(line) for line in fd if line.strip()]
+    with open(output, 'w') as fd:
+        json.dump({'traceEvents': events}, fd)
+
+
+def start_span(name, **args):
+    return tracer.start_span(name, **args)
+
+
+@contextmanager
+def use(span):
+    """make span the parent of the spans started in this block"""
+    if span is None:
+        yield
+        return
+    token = current_span.set(span)
+    try:
+        yield
+    finally:
+        current_span.reset(token)
+
+
+def reparent(span, parent):
+    """nest an already started span under parent, both must be sampled"""
+    if isinstance(span, Span) and isinstance(parent, Span):
+        span.parent_id = parent.span_id
+        span.root_id = parent.root_id
+
+
+if (_path := os.environ.get(TRACE_ENV)):
+    configure(_path, float(os.environ.get(TRACE_SAMPLE_ENV, '1.0')))
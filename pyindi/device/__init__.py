@@ -14,5 +14,7 @@
 from .device import *
 
 __all__ = ['stdio', 'printa', 'WinIO', 'INDIEnumMember', 'INDIEnum', 'IPState', 'IPerm',
-           'ISRule', 'ISState', 'IVectorProperty', 'IProperty', 'INumberVector', 'INumber', 'ITextVector',
-           'IText', 'ILightVector', 'ILight', 'ISwitchVector', 'ISwitch', 'IBLOBVector', 'IBLOB', 'device']
+           'ISRule', 'ISState', 'IVectorProperty', 'IProperty', 'INumberVector', 'INumber',
+           'INumberArrayVector', 'ITextVector', 'IText', 'ILightVector', 'ILight',
+           'ISwitchVector', 'ISwitch', 'IBLOBVector', 'IBLOB', 'OutputPolicy', 'device',
+           'DeviceHost']
@@ -9,12 +9,27 @@ from enum import Enum
 from typing import Union, Callable
 import os
 import base64
+import zlib
+import re
+import ctypes
 
 from abc import ABC
 from pathlib import Path
 import functools
 import traceback
 import inspect
+import time
+import collections
+import importlib
+import json
+import tempfile
+import io
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+from xml.sax.saxutils import escape
 
 """
 The Base classes for the pyINDI device. Definitions
@@ -29,6 +44,34 @@ http://www.indilib.org/api/index.html
 now = datetime.datetime.now()
 timestr = now.strftime("%H%M%S-%a")
 
+INDI_DTD = etree.DTD(str(Path(__file__).parent.parent / "data" / "indi.dtd"))
+
+# The attributes the DTD allows for each tag, in DTD order. The
+# serializers below only need the names, so they are looked up once
+# here instead of walking the DTD on every Def/Set.
+_DTD_ATTRIBUTES = {
+    tag.name: tuple(attribute.name for attribute in tag.iterattributes())
+    for tag in INDI_DTD.iterelements()
+}
+
+_MISSING = object()
+
+
+def _dtd_attributes(tagname):
+    try:
+        return _DTD_ATTRIBUTES[tagname]
+    except KeyError:
+        raise AttributeError(
+            f"{tagname} not defined in Document Type Definition") from None
+
+
+def _set_attributes(ele, obj, attributes):
+    """copy the attributes obj has onto the xml element"""
+    for name in attributes:
+        value = getattr(obj, name, _MISSING)
+        if value is not _MISSING:
+            ele.set(name, str(value))
+
 
 async def stdio(limit=asyncio.streams._DEFAULT_LIMIT, loop=None):
     """
@@ -51,12 +94,7 @@ async def stdio(limit=asyncio.streams._DEFAULT_LIMIT, loop=None):
             lambda: asyncio.StreamReaderProtocol(reader, loop=loop),
             sys.stdin)
 
-#        writer_transport, writer_protocol = await loop.connect_write_pipe(
-#            lambda: asyncio.streams.FlowControlMixin(loop=loop),
-#            os.fdopen(sys.stdout.fileno(), 'wb'))
-#        writer = asyncio.streams.StreamWriter(
-#            writer_transport, writer_protocol, None, loop)
-        writer = sys.stdout
+        writer = StdoutWriter(os.dup(sys.stdout.fileno()), loop)
     return reader, writer
 
 
@@ -79,7 +117,8 @@ def printa(msg: Union[str, bytes]):
 class WinIO:
     """Windows does not support asynchronous stdio
        operations. Instead, this object handles
-       those operations in a separate thread."""
+       those operations in a separate thread.
+       Writes are blocking."""
 
     def __init__(self, loop):
         self.loop = loop
@@ -94,14 +133,670 @@ class WinIO:
             functools.partial(sys.stdin.read, nbytes))
         return msg.encode()
 
-    async def write(self, msg):
-        print(msg)
+    def write(self, msg: bytes):
+        sys.stdout.buffer.write(msg)
+        sys.stdout.buffer.flush()
 
     async def drain(self):
         # This does nothing
         await asyncio.sleep(0)
 
 
+class StdoutWriter:
+    """
+    Writes the driver output to fd, a dup of stdout, in a thread.
+    The event loop never blocks on a slow indiserver and drain
+    waits while more than high_water bytes are not written yet.
+
+    The fd stays blocking. A dup shares the file description of
+    stdout, and setting O_NONBLOCK on it, as an asyncio write pipe
+    does, would also make every print or logging call to stdout
+    liable to raise BlockingIOError.
+    """
+
+    transport = None
+
+    def __init__(self, fd, loop, high_water=2**20):
+        self.file = open(fd, "wb")
+        self.loop = loop
+        self.high_water = high_water
+        self.buffered = 0
+        self.error = None
+        self._waiter = None
+        self._queue = queue.SimpleQueue()
+        threading.Thread(target=self._run, daemon=True,
+                         name="stdout writer").start()
+
+    def write(self, data):
+        if self.error is None:
+            self.buffered += len(data)
+            self._queue.put(data)
+
+    async def drain(self):
+        while self.error is None and self.buffered > self.high_water:
+            self._waiter = self.loop.create_future()
+            await self._waiter
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        while True:
+            data = self._queue.get()
+            try:
+                self.file.write(data)
+                self.file.flush()
+            except OSError as error:
+                self._call(self._failed, error)
+                return
+            self._call(self._written, len(data))
+
+    def _call(self, callback, *args):
+        try:
+            self.loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # the loop is closed, nobody waits anymore
+            pass
+
+    def _written(self, nbytes):
+        self.buffered -= nbytes
+        if self.buffered <= self.high_water:
+            self._wake()
+
+    def _failed(self, error):
+        self.error = error
+        self._wake()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+
+def _start_tag(ele):
+    """the opening tag of an empty element, as bytes"""
+    return etree.tostring(ele)[:-2] + b">"
+
+
+def _blob_source(data, chunk_size):
+    """
+    (size, chunks) of a BLOB data source, None if the size is
+    unknown. data is a bytes-like object (bytes, memoryview,
+    numpy array...), a file path or an iterable of bytes-like
+    chunks. Files are opened right away so a missing file fails
+    before anything is sent.
+    """
+    if data is None:
+        return 0, ()
+
+    if isinstance(data, (str, os.PathLike)):
+        fd = open(data, "rb")
+        size = os.fstat(fd.fileno()).st_size
+
+        def read():
+            with fd:
+                while (chunk := fd.read(chunk_size)):
+                    yield chunk
+        return size, read()
+
+    try:
+        view = memoryview(data)
+    except TypeError:
+        return None, iter(data)
+
+    if view.ndim != 1 or view.format != "B":
+        view = view.cast("B") if view.c_contiguous else memoryview(view.tobytes())
+    return view.nbytes, (view[i:i + chunk_size]
+                         for i in range(0, view.nbytes, chunk_size))
+
+
+def _complete_chunks(chunks, nbytes, errors, chunk_size=3 * 2**16):
+    """
+    The chunks, padded with zeros to nbytes if they fail or end
+    early: the size of a BLOB is sent before its data, the element
+    must get that many bytes to stay well formed. The errors are
+    appended to errors.
+    """
+    sent = 0
+    try:
+        for chunk in chunks:
+            chunk = memoryview(chunk).cast("B")
+            sent += chunk.nbytes
+            yield chunk
+    except Exception as error:
+        errors.append(error)
+    else:
+        if sent < nbytes:
+            errors.append(ValueError(f"{sent} of {nbytes} bytes"))
+
+    while sent < nbytes:
+        pad = min(chunk_size, nbytes - sent)
+        sent += pad
+        yield bytes(pad)
+
+
+def feed_parser():
+    """
+    Incremental parser for the driver input. The INDI stream has no
+    root element so we feed a fake one.
+    """
+    parser = etree.XMLPullParser(events=("start", "end"), huge_tree=True)
+    parser.feed(b"<root>")
+    return parser
+
+
+class _BLOBUpload:
+    """
+    One oneBLOB of a newBLOBVector from a client, base64 decoded
+    while it is parsed. The data stays in memory up to memory_limit
+    bytes and goes to a temporary file beyond, value is then a
+    memoryview or the Path of the file. Decoding stops with an
+    error when the data exceeds max_size bytes.
+    """
+
+    def __init__(self, attrib, max_size=None, memory_limit=2**20,
+                 directory=None):
+        self.name = attrib.get("name")
+        self.format = attrib.get("format", "")
+        self.compressed = self.format.endswith(".z")
+        if self.compressed:
+            self.format = self.format[:-2]
+
+        self.max_size = max_size
+        self.memory_limit = memory_limit
+        self.directory = directory
+        self.nbytes = 0
+        self.error = None
+        self.path = None
+        self._out = io.BytesIO()
+        self._carry = b""
+        self._inflate = zlib.decompressobj() if self.compressed else None
+
+        try:
+            size = int(attrib.get("size", 0))
+        except ValueError:
+            size = 0
+        if max_size is not None and size > max_size:
+            self.error = f"{self.name} of {size} bytes exceeds {max_size} bytes"
+
+    def write(self, text):
+        """base64 text as it comes from the client"""
+        if self.error is not None:
+            return
+
+        # base64 may be split anywhere, decode whole 4 char groups only
+        text = self._carry + b"".join(text.split())
+        end = len(text) - len(text) % 4
+        self._carry = text[end:]
+        if end:
+            self._decoded(text[:end])
+
+    def finish(self):
+        if self.error is None:
+            if self._carry:
+                self._decoded(self._carry)
+            if self._inflate is not None and self.error is None:
+                self._store(self._inflate.flush())
+
+        if isinstance(self._out, io.BytesIO):
+            self.value = self._out.getbuffer()
+        else:
+            self._out.close()
+            self.value = self.path
+        self._carry = b""
+        if self.error is not None:
+            self.close()
+
+    def _decoded(self, text):
+        try:
+            raw = base64.b64decode(text)
+            if self._inflate is not None:
+                # inflate at most what may still be stored
+                raw = self._inflate.decompress(raw, self._room())
+        except (ValueError, zlib.error) as error:
+            self.error = f"{self.name} could not be decoded: {error}"
+            return
+        self._store(raw)
+
+    def _room(self):
+        if self.max_size is None:
+            return 0
+        return self.max_size - self.nbytes + 1
+
+    def _store(self, raw):
+        self.nbytes += len(raw)
+        if self.max_size is not None and self.nbytes > self.max_size:
+            self.error = f"{self.name} exceeds {self.max_size} bytes"
+            return
+
+        if self.path is None and self.nbytes > self.memory_limit:
+            # too large for memory, go on in a file
+            fd, path = tempfile.mkstemp(
+                suffix=self.format, prefix="pyindi-", dir=self.directory)
+            out = os.fdopen(fd, "wb")
+            out.write(self._out.getbuffer())
+            self._out, self.path = out, Path(path)
+
+        self._out.write(raw)
+
+    def close(self):
+        """Forget the data, the temporary file is deleted"""
+        self.value = None
+        self._out = io.BytesIO()
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+
+
+class _NewBLOBMessage:
+    """
+    A newBLOBVector from a client. Looks like its xml element, the
+    decoded oneBLOB contents are in uploads.
+    """
+
+    def __init__(self, element, uploads):
+        self.element = element
+        self.uploads = uploads
+
+    @property
+    def tag(self):
+        return self.element.tag
+
+    @property
+    def attrib(self):
+        return self.element.attrib
+
+    def get(self, key, default=None):
+        return self.element.get(key, default)
+
+    def __iter__(self):
+        return iter(self.element)
+
+    def __len__(self):
+        return len(self.element)
+
+    def errors(self):
+        return [upload.error for upload in self.uploads
+                if upload.error is not None]
+
+    def close(self):
+        for upload in self.uploads:
+            upload.close()
+
+
+# a whole tag from its "<", a quoted attribute value may hold ">"
+_TAG = re.compile(rb"""<[^"'>]*(?:(?:"[^"]*"|'[^']*')[^"'>]*)*>""")
+# a "<" starts markup, it is not allowed in attribute values
+_NAME_END = re.compile(rb"[\s/>]")
+
+
+class _UploadSplitter:
+    """
+    Takes the oneBLOB contents of the newBLOBVector messages out of
+    the driver input before it reaches the parser, so that uploads
+    are decoded in large chunks as they arrive and never held in
+    the tree, see _BLOBUpload. The parser gets those oneBLOB
+    elements empty, anything outside a newBLOBVector goes through
+    as it is.
+    """
+
+    START = b"<newBLOBVector"
+    # longest unfinished tag we wait for before giving it to the
+    # parser as it is
+    MAX_TAG = 2**16
+
+    def __init__(self, max_upload=None, upload_memory=2**20, upload_dir=None):
+        self.max_upload = max_upload
+        self.upload_memory = upload_memory
+        self.upload_dir = upload_dir
+        self.pending = b""
+        self.upload = None
+        # uploads of the newBLOBVector being read, None outside one
+        self.vector = None
+        # uploads of the finished newBLOBVectors not yet claimed
+        self.uploads = collections.deque()
+
+    def split(self, data):
+        """The part of data for the parser"""
+        data = self.pending + data
+        self.pending = b""
+        out = []
+        pos = 0
+        while pos < len(data):
+            if self.upload is not None:
+                # base64 has no "<", the closing tag ends the text
+                end = data.find(b"<", pos)
+                if end < 0:
+                    self.upload.write(data[pos:])
+                    break
+                self.upload.write(data[pos:end])
+                self.upload.finish()
+                self.vector.append(self.upload)
+                self.upload = None
+                pos = end
+                continue
+
+            if self.vector is None:
+                start = self._find_vector(data, pos)
+                if start < 0:
+                    # keep a partial "<newBLOBVector" for the next read
+                    keep = len(data)
+                    for n in range(1, len(self.START)):
+                        if data.endswith(self.START[:n]):
+                            keep = len(data) - n
+                    out.append(data[pos:keep])
+                    self.pending = data[keep:]
+                    break
+            else:
+                start = data.find(b"<", pos)
+                if start < 0:
+                    out.append(data[pos:])
+                    break
+
+            out.append(data[pos:start])
+            # the name of a closing tag follows "</"
+            name = _NAME_END.search(data, start + 2)
+            tag = _TAG.match(data, start)
+            if tag is None or name is None:
+                # wait for the rest of the tag
+                self.pending = data[start:]
+                if len(self.pending) > self.MAX_TAG:
+                    # not a tag, the parser has its say
+                    out.append(self.pending)
+                    self.pending = b""
+                break
+
+            pos = tag.end()
+            self._tag(data[start + 1:name.start()], tag.group(), out)
+
+        return b"".join(out)
+
+    def _find_vector(self, data, pos):
+        while (start := data.find(self.START, pos)) >= 0:
+            after = start + len(self.START)
+            if after == len(data) or _NAME_END.match(data, after):
+                return start
+            # a longer name, like <newBLOBVectorX
+            pos = after
+        return -1
+
+    def _tag(self, name, tag, out):
+        out.append(tag)
+        empty = tag.endswith(b"/>")
+        if name == b"newBLOBVector":
+            self.vector = []
+            if empty:
+                self._end_vector()
+        elif name == b"/newBLOBVector":
+            self._end_vector()
+        elif name == b"oneBLOB":
+            if empty:
+                upload = self._upload(tag)
+                upload.finish()
+                self.vector.append(upload)
+            else:
+                self.upload = self._upload(tag[:-1] + b"/>")
+
+    def _end_vector(self):
+        self.uploads.append(self.vector)
+        self.vector = None
+
+    def _upload(self, tag):
+        attrib = etree.fromstring(tag).attrib
+        return _BLOBUpload(
+            attrib, self.max_upload, self.upload_memory, self.upload_dir)
+
+    def claim(self, element):
+        """The message for the complete newBLOBVector element"""
+        uploads = self.uploads.popleft() if self.uploads else []
+        return _NewBLOBMessage(element, uploads)
+
+    def reset(self):
+        """drop everything in progress, after a syntax error"""
+        if self.upload is not None:
+            self.upload.close()
+        for upload in self.vector or ():
+            upload.close()
+        for uploads in self.uploads:
+            for upload in uploads:
+                upload.close()
+        self.uploads.clear()
+        self.upload = None
+        self.vector = None
+        self.pending = b""
+
+
+async def read_messages(reader, read_width=2**16, max_upload=None,
+                        upload_memory=2**20, upload_dir=None):
+    """
+    Read the reader in large chunks and feed them to an incremental
+    parser. Yields the list of complete top-level elements of every
+    read, however the messages are split across reads or lines.
+    Stops at end of file.
+
+    BLOBs uploaded by the clients are decoded on the fly with
+    constant memory, see _BLOBUpload for the other arguments.
+    """
+    splitter = _UploadSplitter(max_upload, upload_memory, upload_dir)
+    parser = feed_parser()
+    root = None
+    depth = 0
+    while True:
+
+        data = await reader.read(read_width)
+        if not data:
+            logging.warning("stdin closed, stop reading")
+            splitter.reset()
+            return
+
+        messages = []
+        try:
+            parser.feed(splitter.split(data))
+            for event, ele in parser.read_events():
+                if event == "start":
+                    depth += 1
+                    if depth == 1:
+                        root = ele
+                    continue
+
+                depth -= 1
+                if depth == 1:
+                    # complete top-level message
+                    root.remove(ele)
+                    if ele.tag == "newBLOBVector":
+                        ele = splitter.claim(ele)
+                    messages.append(ele)
+
+        except etree.XMLSyntaxError as error:
+            logging.error(f"Could not parse xml {error}, resetting parser")
+            splitter.reset()
+            parser = feed_parser()
+            depth = 0
+
+        yield messages
+
+
+SKELETON_TAGS = (
+    "defSwitchVector",
+    "defTextVector",
+    "defNumberVector",
+    "defBLOBVector",
+    "defLightVector",
+)
+
+# bump when the layout of the compiled skeletons or
+# the def messages change
+_SKELETON_VERSION = 1
+_skeletons = {}
+
+
+def _skeleton_cache_path(skelfile):
+    skelfile = Path(skelfile)
+    return skelfile.with_name(skelfile.name + ".cache.json")
+
+
+def parse_skeleton(skelfile):
+    """
+    The vector definitions of a skeleton file as a list of
+    (tag, vector attributes, [member attributes]), the text of
+    a member is its "value" attribute.
+    """
+    definitions = []
+    for xml_def in etree.parse(str(skelfile)).getroot():
+        if xml_def.tag not in SKELETON_TAGS:
+            # Ignore anything not a vector definition.
+            continue
+
+        properties = []
+        for prop in xml_def:
+            if not isinstance(prop.tag, str):
+                # comments
+                continue
+            att = dict(prop.attrib)
+            att['value'] = (prop.text or "").strip()
+            properties.append(att)
+
+        definitions.append((xml_def.tag, dict(xml_def.attrib), properties))
+
+    return definitions
+
+
+def compile_skeleton(skelfile):
+    """
+    parse_skeleton with a cache. Every definition is checked with
+    device.vectorFactory, then the result is kept in memory and in
+    a json file next to the skeleton, both are used again until
+    the modification time or the size of the skeleton changes.
+
+    The definitions are (tag, vector attributes, [member
+    attributes], def message of the vector as built).
+    """
+    path = Path(skelfile).resolve()
+    stat = path.stat()
+    stamp = [_SKELETON_VERSION, stat.st_mtime_ns, stat.st_size]
+
+    cached = _skeletons.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    cache = _skeleton_cache_path(path)
+    definitions = None
+    try:
+        with open(cache) as fd:
+            compiled = json.load(fd)
+        if compiled["stamp"] == stamp:
+            definitions = compiled["definitions"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    if definitions is None:
+        definitions = []
+        for tag, attribs, properties in parse_skeleton(path):
+            try:
+                vec = device.vectorFactory(
+                    tag, dict(attribs), [dict(prop) for prop in properties])
+            except Exception as error:
+                logging.error(f"The following error was caused by the {tag} "
+                              f"{attribs.get('name')} of {path}")
+                logging.error(error)
+                raise
+            xml = etree.tostring(vec.Def(), pretty_print=True, encoding="unicode")
+            definitions.append((tag, attribs, properties, xml))
+
+        tmp = cache.with_name(f"{cache.name}.{os.getpid()}")
+        try:
+            with open(tmp, "w") as fd:
+                json.dump({"stamp": stamp, "definitions": definitions}, fd)
+            os.replace(tmp, cache)
+        except OSError as error:
+            logging.debug(f"could not write the skeleton cache {cache}: {error}")
+
+    _skeletons[path] = (stamp, definitions)
+    return definitions
+
+
+class _SharedArray(collections.namedtuple("_SharedArray", "name shape dtype")):
+    """A numpy array handed back from a worker process in shared memory"""
+
+    @classmethod
+    def share(cls, array):
+        shm = shared_memory.SharedMemory(create=True, size=array.nbytes)
+        type(array)(array.shape, array.dtype, buffer=shm.buf)[...] = array
+        # the parent unlinks it, not the tracker of the worker
+        resource_tracker.unregister(shm._name, "shared_memory")
+        shm.close()
+        return cls(shm.name, array.shape, array.dtype.str)
+
+    def load(self):
+        """
+        The array, a view on the shared memory, nothing is copied.
+        The segment is unlinked at once and stays mapped as long as
+        the array or a view of it is alive.
+        """
+        import numpy
+
+        shm = shared_memory.SharedMemory(name=self.name)
+        shm.unlink()
+        return numpy.asarray(_SharedSegment(shm, self.shape, self.dtype))
+
+    def unlink(self):
+        """Unlink the segment of a result nobody loads"""
+        try:
+            shm = shared_memory.SharedMemory(name=self.name)
+        except FileNotFoundError:
+            return
+        shm.unlink()
+        shm.close()
+
+
+class _SharedSegment:
+    """
+    The base of the arrays loaded by _SharedArray. numpy keeps it
+    alive with the arrays and the views made from them; the segment
+    is closed when the last one goes, closing it before would unmap
+    memory they still point to.
+    """
+
+    def __init__(self, shm, shape, dtype):
+        self.shm = shm
+        # holds an export of shm.buf, shm cannot be closed meanwhile
+        self.pointer = ctypes.c_char.from_buffer(shm.buf)
+        self.__array_interface__ = dict(
+            shape=tuple(shape), typestr=dtype, version=3,
+            data=(ctypes.addressof(self.pointer), False))
+
+    def __del__(self):
+        self.pointer = None
+        self.shm.close()
+
+
+def _offload_call(module, qualname, args, kwargs):
+    """
+    Run a device.offload(pool='process') function in a worker. The
+    function is found again by name, numpy results come back through
+    shared memory instead of the pipe.
+    """
+    target = importlib.import_module(module)
+    for part in qualname.split("."):
+        target = getattr(target, part)
+    result = target.__wrapped__(*args, **kwargs)
+
+    numpy = sys.modules.get("numpy")
+    if numpy is not None and type(result) is numpy.ndarray and result.nbytes:
+        return _SharedArray.share(result)
+    return result
+
+
+def _release_shared(future):
+    """
+    Done callback of the offloaded calls whose caller is gone, it
+    was cancelled or the pools were shut down: the shared memory of
+    their result is unlinked, nobody loads it anymore.
+    """
+    if future.cancelled() or future.exception() is not None:
+        return
+    result = future.result()
+    if isinstance(result, _SharedArray):
+        result.unlink()
+
+
 class INDIEnumMember(int):
     """
     ## INDIEnumMember
@@ -229,13 +924,18 @@ class IVectorProperty(ABC):
     be handled by setter and getter decorators.
 
     """
-    dtd = etree.DTD(
-        (Path(__file__).parent / "data/indi.dtd").open())
+    dtd = INDI_DTD
 
     def __init__(self,
                  device: str, name: str, state: IPState,
                  label: str = None, group: str = None):
 
+        self._set_template = None
+        # member name -> position in elements, see _member
+        self._member_index = {}
+        # what the clients were last sent, see Set(changed_only=True)
+        self._sent_values = {}
+        self._sent_state = None
         self.device = device
         self.name = name
 
@@ -280,18 +980,8 @@ class IVectorProperty(ABC):
         """
 
         tagname = "def" + self.tagcontext
-        dtd_elements = {tag.name: tag for tag in self.dtd.iterelements()}
-        if tagname not in dtd_elements:
-            raise AttributeError(
-                "{tagname} not defined in \
-                                 Document Type Definition")
-
-        ele_definition = dtd_elements[tagname]
-        ele = etree.Element(ele_definition.name)
-
-        for attribute in ele_definition.iterattributes():
-            if hasattr(self, attribute.name):
-                ele.set(attribute.name, str(getattr(self, attribute.name)))
+        ele = etree.Element(tagname)
+        _set_attributes(ele, self, _dtd_attributes(tagname))
 
         for prop in self.iprops:
             ele.append(prop.Def())
@@ -299,6 +989,7 @@ class IVectorProperty(ABC):
         if msg is not None:
             ele.set("message", msg)
 
+        self._mark_sent(self.iprops)
         return ele
 
     def __str__(self):
@@ -307,33 +998,131 @@ class IVectorProperty(ABC):
     def __repr__(self):
         return self.__str__()
 
-    def Set(self, msg=None):
+    def Set(self, msg=None, changed_only=False):
         """
         This will put together the setXXX xml element
         for any vector property. It uses the dtd file(s)
         to map xml attribute to members of this class.
+
+        With changed_only only the members whose value differs
+        from what was last sent with Def or Set are included.
+        If neither the members, the state nor the timeout changed
+        and there is no msg, None is returned and nothing needs
+        to be sent.
+
+        The element is reused by the next call, serialize
+        it before calling Set again.
         """
-        tagname = "set" + self.tagcontext
-        dtd_elements = {tag.name: tag for tag in self.dtd.iterelements()}
-        if tagname not in dtd_elements:
-            raise AttributeError(
-                f"{tagname} not defined in \
-                                 Document Type Definition")
-
-        ele_definition = dtd_elements[tagname]
-        ele = etree.Element(ele_definition.name)
-        for attribute in ele_definition.iterattributes():
-            if hasattr(self, attribute.name):
-                ele.set(attribute.name, str(getattr(self, attribute.name)))
-        for prop in self.iprops:
-            logging.warning(prop)
-            ele.append(prop.Set())
+        template = self._set_template
+        if template is None or template[0] != len(self.iprops) \
+                or any(a is not b for a, b in zip(template[2], self.iprops)):
+            template = self._set_template = self._build_set_template()
+
+        _, ele, props, children, vec_attributes, child_attributes, _, _ = template
+        texts = [str(prop.value) for prop in props]
+
+        if changed_only:
+            sent = self._sent_values
+            changed = [i for i, (prop, text) in enumerate(zip(props, texts))
+                       if sent.get(prop.name) != text]
+            if len(changed) < len(props):
+                state_changed = self._sent_state != self._state_key()
+                if not changed and not state_changed and msg is None:
+                    return None
+                return self._delta_element(
+                    template, texts, changed or [0], msg)
+
+        _set_attributes(ele, self, vec_attributes)
+        for prop, child, text in zip(props, children, texts):
+            _set_attributes(child, prop, child_attributes)
+            child.text = text
 
         if msg is not None:
             ele.set("message", msg)
+        else:
+            ele.attrib.pop("message", None)
 
+        self._mark_sent(props, texts)
         return ele
 
+    def _delta_element(self, template, texts, changed, msg):
+        """
+        setXXX element with only the changed members. The dtd
+        wants at least one member so a state only update carries
+        the first one. Like the full element it comes from the
+        template, the members are moved in, not built.
+        """
+        (_, _, props, _, vec_attributes, child_attributes,
+         delta, members) = template
+        del delta[:]
+        _set_attributes(delta, self, vec_attributes)
+        for i in changed:
+            child = members[i]
+            _set_attributes(child, props[i], child_attributes)
+            child.text = texts[i]
+            delta.append(child)
+
+        if msg is not None:
+            delta.set("message", msg)
+        else:
+            delta.attrib.pop("message", None)
+
+        self._mark_sent([props[i] for i in changed], [texts[i] for i in changed])
+        return delta
+
+    def changes(self):
+        """
+        The members whose value differs from what was last sent,
+        as (member, text last sent or None) pairs.
+        """
+        sent = self._sent_values
+        return [(prop, sent.get(prop.name)) for prop in self.iprops
+                if sent.get(prop.name) != str(prop.value)]
+
+    def state_changed(self):
+        """True if state or timeout changed since the last Def/Set"""
+        return self._sent_state != self._state_key()
+
+    def _state_key(self):
+        return (self._state, getattr(self, "timeout", None))
+
+    def _mark_sent(self, props, texts=None):
+        if texts is None:
+            texts = [str(prop.value) for prop in props]
+        self._sent_values.update(
+            zip([prop.name for prop in props], texts))
+        self._sent_state = self._state_key()
+
+    def _build_set_template(self):
+        """
+        The setXXX element is built once per vector and reused by Set,
+        which only refreshes the attribute values and the member texts.
+        A second element and a second set of members, not attached to
+        it, make the changed_only updates. Rebuilt when members are
+        added or replaced.
+        """
+        tagname = "set" + self.tagcontext
+        vec_attributes = _dtd_attributes(tagname)
+        ele = etree.Element(tagname)
+        delta = etree.Element(tagname)
+
+        props = tuple(self.iprops)
+        children = []
+        members = []
+        if props:
+            child_tag = "one" + props[0].tagcontext
+            child_attributes = tuple(
+                name for name in _dtd_attributes(child_tag) if name != "name")
+            for prop in props:
+                children.append(
+                    etree.SubElement(ele, child_tag, name=str(prop.name)))
+                members.append(etree.Element(child_tag, name=str(prop.name)))
+        else:
+            child_attributes = ()
+
+        return (len(props), ele, props, children,
+                vec_attributes, child_attributes, delta, members)
+
     @property
     def elements(self):
         if isinstance(self, INumberVector):
@@ -347,24 +1136,43 @@ class IVectorProperty(ABC):
         elif isinstance(self, IBLOBVector):
             return self.bp
 
+    def _member(self, name):
+        """
+        The member called name or None. Positions are indexed by
+        name and checked on every lookup, the index is rebuilt when
+        members were added, removed or reordered.
+        """
+        elements = self.elements
+        i = self._member_index.get(name)
+        if i is None or i >= len(elements) or elements[i].name != name:
+            self._member_index = {
+                ele.name: i for i, ele in enumerate(elements)}
+            i = self._member_index.get(name)
+            if i is None:
+                return None
+
+        return elements[i]
+
     def __getitem__(self, name: str):
         """
         retrieve the IProperty
         """
-        for ele in self.elements:
-            if ele.name == name:
-                return ele
+        ele = self._member(name)
+        if ele is None:
+            raise KeyError(f"{name} not in {self.__str__()}")
 
-        raise KeyError(f"{name} not in {self.__str__()}")
+        return ele
 
     def __setitem__(self, name, val):
 
-        for ele in self.elements:
-            if ele.name == name:
-                ele.value = val
-                return
+        ele = self._member(name)
+        if ele is None:
+            raise KeyError(f"{name} not in {self.__str__()}")
 
-        raise KeyError(f"{name} not in {self.__str__()}")
+        ele.value = val
+
+    def __contains__(self, name):
+        return self._member(name) is not None
 
     def __iter__(self):
         for ele in self.elements:
@@ -372,8 +1180,7 @@ class IVectorProperty(ABC):
 
 
 class IProperty:
-    dtd = etree.DTD(
-        (Path(__file__).parent / "data/indi.dtd").open())
+    dtd = INDI_DTD
 
     def __init__(self, name: str, label: str = None):
 
@@ -391,18 +1198,8 @@ class IProperty:
 
     def Def(self):
         tagname = "def" + self.tagcontext
-        dtd_elements = {tag.name: tag for tag in self.dtd.iterelements()}
-
-        if tagname not in dtd_elements:
-            raise AttributeError(
-                f"{tagname} not defined in \
-                                 Document Type Definition")
-
-        ele_definition = dtd_elements[tagname]
-        ele = etree.Element(ele_definition.name)
-        for attribute in ele_definition.iterattributes():
-            if hasattr(self, attribute.name):
-                ele.set(attribute.name, str(getattr(self, attribute.name)))
+        ele = etree.Element(tagname)
+        _set_attributes(ele, self, _dtd_attributes(tagname))
 
         # Blob definitions have empty data.
         if not isinstance(self, IBLOB):
@@ -412,18 +1209,8 @@ class IProperty:
 
     def Set(self):
         tagname = "one" + self.tagcontext
-        dtd_elements = {tag.name: tag for tag in self.dtd.iterelements()}
-
-        if tagname not in dtd_elements:
-            raise AttributeError(
-                f"{tagname} not defined in \
-                                 Document Type Definition")
-
-        ele_definition = dtd_elements[tagname]
-        ele = etree.Element(ele_definition.name)
-        for attribute in ele_definition.iterattributes():
-            if hasattr(self, attribute.name):
-                ele.set(attribute.name, str(getattr(self, attribute.name)))
+        ele = etree.Element(tagname)
+        _set_attributes(ele, self, _dtd_attributes(tagname))
 
         ele.text = str(self.value)
 
@@ -532,6 +1319,215 @@ class INumber(IProperty):
             raise ValueError(f"""INumber value must be a number not {val}""")
 
 
+class INumberArrayVector(INumberVector):
+    """
+    INumberVector whose member values live in one contiguous
+    numpy array, for vectors with hundreds of numbers.
+
+    vec.values is the float64 array, writing into it
+    (vec.values[:] = arr) or assigning it (vec.values = arr)
+    updates every member at once, update() does the same and
+    clips to min/max. The members in vec.np are views on the
+    array so vec[name], IUUpdate and the new values of the
+    clients work as for INumberVector. The members are fixed
+    at construction.
+
+    IDSet finds the members to send by comparing the array with
+    a copy of what was last sent and renders all the texts in
+    one pass.
+    """
+
+    def __init__(self,
+                 names: list,
+                 device: str,
+                 name: str,
+                 state: IPState,
+                 perm: IPerm,
+                 values=0.0,
+                 format: str = "%g",
+                 min=0.0,
+                 max=0.0,
+                 step=0.0,
+                 timeout: float = 0,
+                 timestamp: datetime.datetime = None,
+                 label: str = None,
+                 group: str = None,
+                 labels: list = None,
+                 wire_format: str = None):
+        """
+         ## Arguments:
+         * names: names of the members
+         * values, min, max, step: a number for every member
+           or a sequence with one number per member
+         * format: printf format of every member
+         * labels: labels of the members, by default the names
+         * wire_format: printf format of the values in the sets,
+           by default the shortest exact text as for INumberVector.
+           A shorter one like "%.6g" is much faster to render.
+         * the others as for INumberVector
+
+        """
+        import numpy
+
+        size = len(names)
+        self._values = numpy.array(
+            numpy.broadcast_to(values, (size,)), dtype=numpy.float64)
+        self.min = numpy.array(numpy.broadcast_to(min, (size,)), dtype=numpy.float64)
+        self.max = numpy.array(numpy.broadcast_to(max, (size,)), dtype=numpy.float64)
+        self.step = numpy.array(numpy.broadcast_to(step, (size,)), dtype=numpy.float64)
+        self.format = format
+        self.wire_format = wire_format
+        # values last sent, None before the first Def/Set
+        self._sent_array = None
+
+        if labels is None:
+            labels = names
+
+        self._names = [str(member) for member in names]
+        np = [_ArrayNumber(self, i, member, label)
+              for i, (member, label) in enumerate(zip(self._names, labels))]
+        super().__init__(np, device, name, state, perm,
+                         timeout, timestamp, label, group)
+
+    @property
+    def values(self):
+        return self._values
+
+    @values.setter
+    def values(self, values):
+        self._values[:] = values
+
+    def update(self, values, clip=True):
+        """
+        Copy values into the vector. With clip the values are
+        limited to [min, max] of members which have max > min.
+        """
+        import numpy
+
+        values = numpy.asarray(values, dtype=numpy.float64)
+        if clip:
+            bounded = self.max > self.min
+            values = numpy.where(
+                bounded, numpy.clip(values, self.min, self.max), values)
+
+        self._values[:] = values
+
+    def dirty(self):
+        """Boolean mask of the members changed since the last Def/Set"""
+        import numpy
+
+        sent = self._sent_array
+        if sent is None:
+            return numpy.ones(self._values.shape, dtype=bool)
+
+        values = self._values
+        return (values != sent) & ~(numpy.isnan(values) & numpy.isnan(sent))
+
+    def texts(self, index=None):
+        """
+        The text of every member as sent to the clients, or of
+        the members at the positions in index.
+        """
+        values = self._values if index is None else self._values[index]
+        values = values.tolist()
+        if self.wire_format is None:
+            return list(map(str, values))
+
+        # one formatting pass over all the values
+        text = ((self.wire_format + "\0") * len(values)) % tuple(values)
+        return text.split("\0")[:-1]
+
+    def Set(self, msg=None, changed_only=False):
+        """See IVectorProperty.Set"""
+        tagname = "setNumberVector"
+        if changed_only:
+            changed = self.dirty().nonzero()[0]
+            if len(changed) < len(self.np):
+                if not len(changed):
+                    if not self.state_changed() and msg is None:
+                        return None
+                    # state only update, the dtd wants one member
+                    changed = [0]
+
+                ele = etree.Element(tagname)
+                _set_attributes(ele, self, _dtd_attributes(tagname))
+                if msg is not None:
+                    ele.set("message", msg)
+
+                names = self._names
+                for i, text in zip(changed, self.texts(changed)):
+                    etree.SubElement(ele, "oneNumber", name=names[i]).text = text
+
+                self._mark_sent(self.np)
+                return ele
+
+        if self._set_template is None:
+            # the members are fixed, build the children once
+            self._set_template = etree.Element(tagname)
+            for name in self._names:
+                etree.SubElement(self._set_template, "oneNumber", name=name)
+
+        ele = self._set_template
+        _set_attributes(ele, self, _dtd_attributes(tagname))
+        if msg is not None:
+            ele.set("message", msg)
+        else:
+            ele.attrib.pop("message", None)
+
+        for child, text in zip(ele, self.texts()):
+            child.text = text
+
+        self._mark_sent(self.np)
+        return ele
+
+    def changes(self):
+        """See IVectorProperty.changes"""
+        sent = self._sent_array
+        return [(self.np[i], None if sent is None else str(sent[i]))
+                for i in self.dirty().nonzero()[0].tolist()]
+
+    def _mark_sent(self, props, texts=None):
+        # Def and Set always leave the clients with the whole array
+        self._sent_array = self._values.copy()
+        self._sent_state = self._state_key()
+
+
+class _ArrayNumber(INumber):
+    """A member of an INumberArrayVector, a view on its arrays"""
+
+    def __init__(self, vector, index, name, label=None):
+        IProperty.__init__(self, name, label)
+        self._vector = vector
+        self._index = index
+
+    @property
+    def value(self):
+        return float(self._vector._values[self._index])
+
+    @value.setter
+    def value(self, val):
+        try:
+            self._vector._values[self._index] = float(val)
+        except Exception:
+            raise ValueError(f"""INumber value must be a number not {val}""")
+
+    @property
+    def format(self):
+        return self._vector.format
+
+    @property
+    def min(self):
+        return float(self._vector.min[self._index])
+
+    @property
+    def max(self):
+        return float(self._vector.max[self._index])
+
+    @property
+    def step(self):
+        return float(self._vector.step[self._index])
+
+
 class ITextVector(IVectorProperty):
     tagcontext = "TextVector"
 
@@ -672,18 +1668,13 @@ class ISwitchVector(IVectorProperty):
         # If its one of many we need to set the
         # other items.
         if self.rule == "OneOfMany" and value == 'On':
-            exists = False
-            for sw in self.elements:
-
-                if sw.name == name:
-                    exists = True
-                    sw.value = 'On'
-                else:
-                    sw.value = 'Off'
-
-            if not exists:
+            on = self._member(name)
+            if on is None:
                 raise KeyError(f"Switch {name} not in {self.name}.")
 
+            for sw in self.elements:
+                sw.value = 'On' if sw is on else 'Off'
+
         else:
             super().__setitem__(name, value)
 
@@ -732,20 +1723,54 @@ class IBLOBVector(IVectorProperty):
                  label: str = None,
                  timeout: str = None,
                  group: str = None,
-                 timestamp: str = None):
+                 timestamp: str = None,
+                 compression: int = None):
         """
          ## Arguments:
          * np: List of INumber properties in the INumberVector
          * device: Name of indi device
          * name: Name of INumberVector
          * state: State
+         * compression: zlib level of the members sent with
+           IDSetBLOB, None to send them as they are
 
         """
 
         self.perm = perm
         self.bp = bp
+        self.compression = compression
         super().__init__(device, name, state, label, group)
 
+    def stream(self, msg=None, chunk_size=3 * 2**16):
+        """
+        The setBLOBVector as an iterator of bytes. The data of each
+        member is read and base64 encoded chunk_size bytes at a time,
+        so it is never held encoded as a whole.
+        """
+        # the sources are opened here, not when the iterator starts,
+        # so a missing file raises to the caller
+        return self.stream_sources(
+            [blob.source(chunk_size) for blob in self.bp], msg)
+
+    def compressed_sources(self, level, chunk_size=3 * 2**16):
+        """the member sources zlib compressed, see IBLOB.compressed_source"""
+        return [blob.compressed_source(level, chunk_size) for blob in self.bp]
+
+    def stream_sources(self, sources, msg=None, errors=None):
+        """
+        the setBLOBVector of already opened member sources. A source
+        failing midway is padded to its size, see IBLOB.stream.
+        """
+        ele = etree.Element("set" + self.tagcontext)
+        _set_attributes(ele, self, _dtd_attributes(ele.tag))
+        if msg is not None:
+            ele.set("message", msg)
+
+        yield _start_tag(ele)
+        for blob, source in zip(self.bp, sources):
+            yield from blob.stream(*source, errors=errors)
+        yield b"</" + ele.tag.encode() + b">"
+
 
 class IBLOB(IProperty):
     tagcontext = "BLOB"
@@ -783,13 +1808,511 @@ class IBLOB(IProperty):
 
 
     @value.setter
-    def value(self, val: bytes):
-        if type(val) != bytes:
-            raise ValueError("""IBLOB value must by bytes type""")
+    def value(self, val):
+        """
+        bytes-like objects (bytes, memoryview, numpy arrays), a
+        file path or an iterable of bytes chunks. Nothing is copied,
+        paths and iterables are read when the BLOB is sent. The size
+        of an iterable is unknown, set the size member after the
+        value or it is collected in memory before sending.
+        """
+        if isinstance(val, (str, os.PathLike)):
+            self.size = os.path.getsize(val)
+        else:
+            try:
+                self.size = memoryview(val).nbytes
+            except TypeError:
+                self.size = None
 
-        self.size = len(val)
         self.data = val
 
+    def source(self, chunk_size):
+        """
+        (size, chunks, nbytes, format) of the data to send: the
+        size of the data, the chunks to encode, their total length
+        and the format attribute.
+        """
+        size, chunks = _blob_source(self.data, chunk_size)
+        if size is None:
+            size = getattr(self, "size", None)
+        if size is None:
+            data = b"".join(chunks)
+            size, chunks = len(data), (data,)
+        return size, chunks, size, self.format
+
+    def compressed_source(self, level, chunk_size):
+        """
+        Same as source but zlib compressed with a ".z" format, if
+        that is smaller than the data. Blocking, meant for a worker
+        thread.
+        """
+        fmt = self.format or ""
+        size, chunks, _, _ = self.source(chunk_size)
+        if fmt.endswith(".z") or size == 0:
+            return size, chunks, size, self.format
+
+        # iterables can be read only once, keep the chunks in case
+        # the compressed data is not smaller
+        keep = not isinstance(self.data, (bytes, str, os.PathLike))
+        try:
+            memoryview(self.data)
+            keep = False
+        except TypeError:
+            pass
+
+        compressor = zlib.compressobj(level)
+        compressed = []
+        raw = []
+        for chunk in chunks:
+            compressed.append(compressor.compress(chunk))
+            if keep:
+                raw.append(chunk)
+        compressed.append(compressor.flush())
+        zdata = b"".join(compressed)
+
+        if len(zdata) < size:
+            return size, (zdata,), len(zdata), fmt + ".z"
+        if keep:
+            return size, raw, size, self.format
+        return self.source(chunk_size)
+
+    def stream(self, size, chunks, nbytes=None, format=None, errors=None):
+        """
+        The oneBLOB element, see IBLOBVector.stream. size is the
+        size of the data, nbytes the length of the chunks when they
+        are compressed. If the chunks fail or fall short the data is
+        padded with zeros to nbytes and the error is appended to
+        errors, or logged.
+        """
+        if nbytes is None:
+            nbytes = size
+        ele = etree.Element("one" + self.tagcontext, name=str(self.name))
+        ele.set("size", str(size))
+        ele.set("enclen", str(4 * ((nbytes + 2) // 3)))
+        if format is not None:
+            ele.set("format", str(format))
+        yield _start_tag(ele)
+
+        failed = [] if errors is None else errors
+        carry = b""
+        for chunk in _complete_chunks(chunks, nbytes, failed):
+            if carry:
+                chunk = carry + chunk
+            # only whole 3 byte groups, base64 pads the rest
+            end = len(chunk) - len(chunk) % 3
+            yield base64.b64encode(chunk[:end])
+            carry = bytes(chunk[end:])
+        if carry:
+            yield base64.b64encode(carry)
+
+        yield b"</" + ele.tag.encode() + b">"
+        if errors is None and failed:
+            logging.error(f"BLOB {self.name} was padded: {failed[0]}")
+
+
+class OutputPolicy:
+    """
+    How IDSet conflates the updates of a property.
+
+    max_rate: at most this many sets per second. A set inside
+        the window is held back and the values current at the
+        end of the window are sent, the latest value wins.
+    deadband: number members must move more than this from
+        the value last sent to be worth a set.
+    rel_deadband: same as deadband but relative to the value
+        last sent.
+
+    State (and timeout) transitions and sets with a message
+    are always forwarded at once.
+    """
+
+    def __init__(self, max_rate: float = None,
+                 deadband: float = 0.0, rel_deadband: float = 0.0):
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self.deadband = deadband
+        self.rel_deadband = rel_deadband
+
+    def significant(self, prop, sent):
+        """True if prop moved enough from the text last sent"""
+        if sent is None or not isinstance(prop, INumber):
+            return True
+        if not (self.deadband or self.rel_deadband):
+            return True
+        try:
+            last = float(sent)
+        except ValueError:
+            return True
+        band = max(self.deadband, self.rel_deadband * abs(last))
+        return abs(prop.value - last) > band
+
+
+class _BLOBStream:
+    """
+    A setBLOBVector waiting on outq, see IBLOBVector.stream.
+    Compression starts right away in a worker thread.
+    """
+
+    def __init__(self, vector, msg=None, loop=None):
+        self.vector = vector
+        self.msg = msg
+        if vector.compression is None:
+            self.sources = [blob.source(3 * 2**16) for blob in vector.bp]
+        else:
+            loop = loop or asyncio.get_event_loop()
+            self.sources = loop.run_in_executor(
+                None, vector.compressed_sources, vector.compression)
+
+    async def chunks(self, errors=None):
+        sources = self.sources
+        if isinstance(sources, asyncio.Future):
+            sources = await sources
+        return self.vector.stream_sources(sources, self.msg, errors)
+
+
+class _QueuedSet(bytes):
+    """
+    A setXXX waiting on outq. It remembers its vector so that
+    toindiserver can replace stale sets with the latest values.
+    """
+
+
+class _OutputState:
+    """Conflation state and counters of one property of a device"""
+    __slots__ = ('emitted', 'suppressed', 'last_emit', 'handle', 'msg')
+
+    def __init__(self):
+        self.emitted = 0
+        self.suppressed = 0
+        self.last_emit = None
+        self.handle = None
+        self.msg = None
+
+
+def _in_class_body(func):
+    """True if func is a method defined in a class body"""
+    parts = func.__qualname__.split(".")
+    return len(parts) > 1 and parts[-2] != "<locals>"
+
+
+def _report_error(func, error):
+    sys.stderr.write(
+        f"There was an exception in the \
+        later decorated fxn {func}:")
+
+    sys.stderr.write(f"{error}")
+    sys.stderr.write("See traceback below.")
+    traceback.print_exception(
+        type(error), error, error.__traceback__, file=sys.stderr)
+
+
+class _RepeatJob:
+    """
+    A device.repeat method of one device. Ticks are due at fixed
+    times on the loop clock, start + n * period, whatever the
+    method takes, with a single timer handle. A coroutine method
+    runs as its own task; when a tick comes while it still runs
+    overrun decides: 'skip' the tick, 'queue' it to run as soon as
+    the current run ends (one at most), or run 'concurrent'ly.
+    """
+
+    def __init__(self, instance, func, period, overrun,
+                 max_period=None, stretch=2.0):
+        self.instance = instance
+        self.func = func
+        self.name = func.__name__
+        self.period = period
+        self.overrun = overrun
+
+        # adaptive polling, see device.repeat
+        self.base_period = period
+        self.max_period = max_period
+        self.stretch = stretch
+        self.loop = instance.mainloop or asyncio.get_event_loop()
+        self.handle = None
+        self.due = None
+        self.running = 0
+        self.queued = False
+        self.tasks = set()
+
+        self.runs = 0
+        self.skipped = 0
+        self.last_run_time = 0.0
+        self.max_run_time = 0.0
+        self.last_lateness = 0.0
+        self.max_lateness = 0.0
+
+    def start(self, delay=None):
+        self.cancel()
+        self.due = self.loop.time() + (self.period if delay is None else delay)
+        self.handle = self.loop.call_at(self.due, self.tick)
+
+    def cancel(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+
+    def tick(self):
+        lateness = max(0.0, self.loop.time() - self.due)
+        self.last_lateness = lateness
+        self.max_lateness = max(self.max_lateness, lateness)
+
+        # stay on the grid, ticks missed by a blocked loop are skipped
+        missed = int(lateness // self.period)
+        self.skipped += missed
+        self.due += (missed + 1) * self.period
+        self.handle = self.loop.call_at(self.due, self.tick)
+
+        if self.running and self.overrun != "concurrent":
+            if self.overrun == "queue" and not self.queued:
+                self.queued = True
+            else:
+                self.skipped += 1
+            return
+
+        self.run()
+
+    def run(self):
+        start = self.loop.time()
+        emitted = self.instance._emitted
+        self.running += 1
+        watchdog = self.instance._watchdog
+        if watchdog is not None:
+            watchdog.enter(self.instance, f"repeat {self.name}")
+        try:
+            result = self.func(self.instance)
+        except Exception as error:
+            _report_error(self.func, error)
+            self.finished(start, emitted)
+            return
+        finally:
+            if watchdog is not None:
+                watchdog.leave()
+
+        if inspect.isawaitable(result):
+            task = asyncio.ensure_future(result)
+            self.tasks.add(task)
+            task.add_done_callback(
+                functools.partial(self.task_done, start, emitted))
+        else:
+            self.finished(start, emitted, result)
+
+    def task_done(self, start, emitted, task):
+        self.tasks.discard(task)
+        result = None
+        if task.cancelled():
+            pass
+        elif task.exception() is not None:
+            _report_error(self.func, task.exception())
+        else:
+            result = task.result()
+        self.finished(start, emitted, result)
+
+    def finished(self, start, emitted, result=None):
+        run_time = self.loop.time() - start
+        self.running -= 1
+        self.runs += 1
+        self.last_run_time = run_time
+        self.max_run_time = max(self.max_run_time, run_time)
+
+        if self.max_period is not None:
+            # a run changed something if it says so or if it sent a set
+            if isinstance(result, bool):
+                changed = result
+            else:
+                changed = self.instance._emitted != emitted
+
+            if changed:
+                self.wake()
+            elif self.instance.idle():
+                self.period = min(self.period * self.stretch, self.max_period)
+
+        if self.queued and not self.running and self.handle is not None:
+            self.queued = False
+            self.run()
+
+    def wake(self):
+        """back to the base period, the next tick at most a period away"""
+        if self.period == self.base_period:
+            return
+        self.period = self.base_period
+        if self.handle is not None and self.due - self.loop.time() > self.period:
+            self.start()
+
+    def stats(self):
+        return dict(
+            period=self.period,
+            base_period=self.base_period,
+            runs=self.runs,
+            skipped=self.skipped,
+            running=self.running,
+            last_run_time=self.last_run_time,
+            max_run_time=self.max_run_time,
+            last_lateness=self.last_lateness,
+            max_lateness=self.max_lateness,
+        )
+
+
+class _Watchdog:
+    """
+    Watches the event loop of a device, or of all the devices of a
+    DeviceHost, which share one. A coroutine wakes every interval
+    and measures how late it is (the loop lag), a thread checks
+    that it keeps waking and samples the stack of the loop thread
+    when it stops for more than threshold seconds. The synchronous
+    handlers and repeat methods are timed as well, see enter and
+    leave. Stalls and slow calls are logged and sent to the clients
+    with IDMessage; the devices with diagnostics_property get the
+    numbers in their DRIVER_DIAGNOSTICS property.
+    """
+
+    def __init__(self, owner, devices, threshold, interval):
+        # the device or the host, it runs while owner.running
+        self.owner = owner
+        self.devices = list(devices)
+        self.threshold = threshold
+        self.interval = interval
+
+        self.heartbeat = time.monotonic()
+        # (device, label, start) of the call running on the loop
+        self.current = None
+        # (device, label, stack) sampled by the thread during a stall
+        self.sample = None
+        self.reported = 0.0
+        self.thread_id = None
+        self.stopped = threading.Event()
+
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.slow_calls = 0
+        self.slowest_call = 0.0
+        self.culprit = None
+
+        self.vectors = {}
+        for dev in self.devices:
+            if dev.diagnostics_property:
+                members = [INumber(name, "%.1f", 0, 0, 0, 0) for name in (
+                    "MAX_LOOP_LAG_MS", "STALLS", "SLOW_CALLS", "SLOWEST_CALL_MS")]
+                self.vectors[dev] = INumberVector(
+                    members, dev.device, "DRIVER_DIAGNOSTICS", IPState.OK,
+                    IPerm.RO, label="Driver diagnostics", group="Diagnostics")
+
+    def enter(self, dev, label):
+        self.current = (dev, label, time.monotonic())
+
+    def leave(self):
+        if self.current is None:
+            return
+        dev, label, start = self.current
+        self.current = None
+        took = time.monotonic() - start
+        if took > self.threshold:
+            self.slow_calls += 1
+            self.slowest_call = max(self.slowest_call, took)
+            self.report(dev, f"{label} blocked the event loop for "
+                        f"{took * 1000:.0f} ms", label)
+
+    async def run(self):
+        self.thread_id = threading.get_ident()
+        threading.Thread(target=self.monitor, daemon=True,
+                         name=f"{self.devices[0].device} watchdog").start()
+        try:
+            while self.owner.running:
+                expected = time.monotonic() + self.interval
+                await asyncio.sleep(self.interval)
+                now = self.heartbeat = time.monotonic()
+
+                self.lag = max(0.0, now - expected)
+                self.max_lag = max(self.max_lag, self.lag)
+                if self.lag > self.threshold:
+                    self.stalls += 1
+                    if self.reported < expected:
+                        # not a slow call reported by leave
+                        dev, label, _ = self.sample or (None, "an unknown call", None)
+                        self.report(dev, f"event loop blocked for "
+                                    f"{self.lag * 1000:.0f} ms in {label}", label)
+                    self.sample = None
+        finally:
+            self.stopped.set()
+
+    def monitor(self):
+        """In a thread: sample the loop stack once per stall"""
+        while not self.stopped.wait(self.threshold / 2):
+            blocked = time.monotonic() - self.heartbeat
+            if self.sample is not None or blocked < self.threshold + self.interval:
+                continue
+
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            current = self.current
+            if current is not None:
+                dev, label = current[:2]
+            else:
+                code = frame.f_code
+                dev = None
+                label = f"{code.co_name} ({code.co_filename}:{frame.f_lineno})"
+            self.sample = (dev, label, "".join(traceback.format_stack(frame)))
+
+    def report(self, dev, text, label):
+        """Log text and send it to dev, by default the first device"""
+        dev = dev or self.devices[0]
+        self.reported = time.monotonic()
+        self.culprit = label
+        sample = self.sample
+        if sample is not None:
+            logging.warning(f"{dev.device}: {text}, stack:\n{sample[2]}")
+        else:
+            logging.warning(f"{dev.device}: {text}")
+        dev.IDMessage(text, msgtype="WARN")
+        for dev in self.vectors:
+            self.publish(dev)
+
+    def define(self, dev):
+        """IDDef the DRIVER_DIAGNOSTICS of dev, if it wants one"""
+        vec = self.vectors.get(dev)
+        if vec is not None:
+            self._update(vec)
+            dev.IDDef(vec)
+
+    def publish(self, dev):
+        vec = self.vectors[dev]
+        self._update(vec)
+        if dev._props_index.get((vec.device, vec.name)) is vec:
+            # straight to outq, not an IDSet: the watchdog is no
+            # change of the device for the adaptive repeats
+            ele = vec.Set(changed_only=True)
+            if ele is not None:
+                dev.outq.put_nowait(etree.tostring(ele))
+
+    def _update(self, vec):
+        vec["MAX_LOOP_LAG_MS"] = self.max_lag * 1000
+        vec["STALLS"] = self.stalls
+        vec["SLOW_CALLS"] = self.slow_calls
+        vec["SLOWEST_CALL_MS"] = self.slowest_call * 1000
+
+    def stats(self):
+        return dict(
+            lag=self.lag,
+            max_lag=self.max_lag,
+            stalls=self.stalls,
+            slow_calls=self.slow_calls,
+            slowest_call=self.slowest_call,
+            culprit=self.culprit,
+        )
+
+
+async def _run_watchdog(owner, devices, threshold, interval):
+    """Watch the loop of the devices until owner stops running"""
+    watchdog = _Watchdog(owner, devices, threshold, interval)
+    for dev in devices:
+        dev._watchdog = watchdog
+    try:
+        await watchdog.run()
+    finally:
+        for dev in devices:
+            dev._watchdog = None
+
 
 class device(ABC):
     """
@@ -814,9 +2337,42 @@ class device(ABC):
     in a process pool.
     """
 
+    # repeat and NewVectorProperty methods of the class, collected
+    # by __init_subclass__ and copied by every instance
     _registrants = []
     _NewPropertyMethods = {}
 
+    # property name -> OutputPolicy, see IDSet
+    output_policy = {}
+
+    def __init_subclass__(cls, **kwargs):
+        """
+        Collect the methods marked by repeat and NewVectorProperty
+        along the mro, so that every device class has its own
+        registries and a subclass can override the methods.
+        """
+        super().__init_subclass__(**kwargs)
+        repeats = {}
+        methods = {}
+        for klass in reversed(cls.__mro__):
+            # what was registered on the base classes after they were made
+            for func in vars(klass).get("_registrants", ()):
+                repeats[func.__name__] = func
+            methods.update(vars(klass).get("_NewPropertyMethods", {}))
+
+            for attr_name, attr in vars(klass).items():
+                if getattr(attr, "_repeat", None) is not None:
+                    repeats[attr_name] = attr
+                else:
+                    repeats.pop(attr_name, None)
+
+                prop = getattr(attr, "_new_property", None)
+                if prop is not None:
+                    methods[prop] = attr
+
+        cls._registrants = list(repeats.values())
+        cls._NewPropertyMethods = methods
+
     def __init__(self, loop=None, config=None, name=None):
 
         """
@@ -827,7 +2383,14 @@ class device(ABC):
         """
 
         self.props = []
+        # (device, name) -> vector and group -> {name: vector}
+        # for the vectors defined with IDDef, see IUFind
+        self._props_index = {}
+        self._groups = {}
         self.config = config
+
+        self._registrants = list(self._registrants)
+        self._NewPropertyMethods = dict(self._NewPropertyMethods)
         self.timer_queue = asyncio.Queue()
 
         if name is None:
@@ -836,12 +2399,65 @@ class device(ABC):
             self._devname = name
 
         self.outq = asyncio.Queue()
+        self._output_policies = dict(self.output_policy)
+        self._output = {}
         self.handles = []
+        self.read_width = 2**16
+
+        # Bytes buffered for the indiserver before output_overflow
+        # kicks in: 'block' waits for the pipe, 'drop' also replaces
+        # the queued sets of a vector with one set of its latest values.
+        self.output_high_water = 2**20
+        self.output_overflow = 'block'
+
+        # (device, property name or None) -> enableBLOB value
+        self._blob_policy = {}
+
+        # BLOBs uploaded by the clients: larger ones are refused,
+        # those above blob_upload_memory bytes are decoded into a
+        # file in blob_upload_dir (None: the temporary directory)
+        self.max_blob_upload = 2**30
+        self.blob_upload_memory = 2**20
+        self.blob_upload_dir = None
+
+        # merge the newNumberVector messages of a property that
+        # arrive together, see coalesce
+        self.coalesce_new = False
+        self._dispatch_table = self.build_dispatch()
+
+        # coroutine handlers of new*Vector messages running at once,
+        # calls for the same property always wait for each other
+        self.max_handlers = 8
+        self._handler_slots = None
+
+        # pools of the offload decorated methods, made on first use
+        self.offload_workers = None
+        self._pools = {}
+        # their calls still awaited, cancelled by shutdown_pools
+        self._offloaded = set()
+
+        # name -> _RepeatJob of the repeat decorated methods
+        self._repeats = {}
+
+        # adaptive repeats stretch after idle_after seconds without
+        # getProperties or new*Vector from the clients
+        self.idle_after = 60.0
+        self.last_client_activity = time.monotonic()
+        self._emitted = 0
+
+        # report synchronous calls and event loop stalls longer
+        # than watchdog_threshold seconds (e.g. 0.25), None is off.
+        # diagnostics_property also defines DRIVER_DIAGNOSTICS with
+        # the numbers. In a DeviceHost those of the host count.
+        self.watchdog_threshold = None
+        self.watchdog_interval = 0.05
+        self.diagnostics_property = False
+        self._watchdog = None
+        self._handler_locks = {}
+        self._handler_tasks = set()
 
         self._once = True
 
-        self.repeat_q = asyncio.Queue()
-
         self.mainloop = loop
 
     def start(self):
@@ -858,51 +2474,61 @@ class device(ABC):
         self.mainloop = asyncio.get_event_loop()
         self.reader, self.writer = self.mainloop.run_until_complete(stdio())
         self.running = True
+        # the watchdog first, it is in place before any message
         future = asyncio.gather(
+            self.watchdog(),
             self.run(),
-            self.toindiserver(),
-            self.repeat_queuer()
+            self.toindiserver()
         )
 
-        self.mainloop.run_until_complete(future)
+        try:
+            self.mainloop.run_until_complete(future)
+        finally:
+            self.stop_repeats()
+            self.shutdown_pools()
 
-    async def astart(self, *tasks):
+    async def astart(self, *tasks, streams=None):
 
         """Start up in async mode
         Arg: tasks -> any coroutines that
         should be run concurantly with the
         other device tasks.
+        streams -> (reader, writer) to use
+        instead of stdin and stdout, see
+        pyindi.device.harness.
         """
 
         self.mainloop = asyncio.get_running_loop()
-        self.reader, self.writer = await stdio()
+        if streams is None:
+            streams = await stdio()
+        self.reader, self.writer = streams
         self.running = True
+        # the watchdog first, it is in place before any message
         future = asyncio.gather(
+            self.watchdog(),
             self.run(),
             self.toindiserver(),
-            self.repeat_queuer(),
             *tasks
         )
 
-        await future
-
-    async def repeat_queuer(self):
-        while self.running:
-            func = await self.repeat_q.get()
-            try:
-                if inspect.iscoroutinefunction(func):
-                    await func(self)
-                else:
-                    func(self)
-
-            except Exception as error:
-                sys.stderr.write(
-                    f"There was an exception in the \
-                    later decorated fxn {func}:")
-
-                sys.stderr.write(f"{error}")
-                sys.stderr.write("See traceback below.")
-                traceback.print_exc(file=sys.stderr)
+        try:
+            await future
+        finally:
+            self.stop_repeats()
+            self.shutdown_pools()
+
+    async def watchdog(self):
+        """Run the event loop watchdog, see watchdog_threshold"""
+        if self.watchdog_threshold is None:
+            return
+        await _run_watchdog(self, [self], self.watchdog_threshold,
+                            self.watchdog_interval)
+
+    def diagnostics(self):
+        """Event loop lag and slow calls seen by the watchdog, seconds"""
+        if self._watchdog is None:
+            return None
+        return self._watchdog.stats()
 
     def exception(self, loop, context):
 
@@ -927,129 +2553,456 @@ class device(ABC):
         return f"<{self.name()}>"
 
     async def toindiserver(self):
+        """
+        Write everything waiting in outq to the indiserver with
+        a single write and wait for the pipe to drain. The event
+        loop keeps running while a slow indiserver catches up,
+        the output piles up in outq and goes out with the next
+        write.
+        """
 
-        while self.running:
-            output = await self.outq.get()
+        transport = getattr(self.writer, 'transport', None)
+        if transport is not None:
+            transport.set_write_buffer_limits(high=self.output_high_water)
+        elif isinstance(self.writer, StdoutWriter):
+            self.writer.high_water = self.output_high_water
 
-            logging.debug(output.decode())
-            self.writer.write(output.decode())
-            self.writer.flush()
+        blobs = collections.deque()
+        while self.running:
+            batch = []
+            if not blobs:
+                batch.append(await self.outq.get())
+            while not self.outq.empty():
+                batch.append(self.outq.get_nowait())
+
+            # BLOBs go out one at a time, the sets queued meanwhile
+            # are written in between.
+            blobs.extend(item for item in batch if isinstance(item, _BLOBStream))
+            batch = [item for item in batch if not isinstance(item, _BLOBStream)]
+
+            size = sum(map(len, batch))
+            if size > self.output_high_water and self.output_overflow == 'drop':
+                batch = self._drop_stale(batch)
+
+            if batch:
+                output = b"".join(
+                    item.encode() if isinstance(item, str) else item
+                    for item in batch)
+
+                if logging.getLogger().isEnabledFor(logging.DEBUG):
+                    logging.debug("%d bytes to indiserver: %r",
+                                  len(output), output[:256])
+                self.writer.write(output)
+                await self.writer.drain()
+
+            if blobs:
+                await self._write_blob(blobs.popleft())
+
+    async def _write_blob(self, stream):
+        errors = []
+        try:
+            chunks = await stream.chunks(errors)
+        except Exception as error:
+            # the sources could not be compressed, nothing was written
+            logging.error(f"BLOB {stream.vector.name} not sent: {error}")
+            self.IDMessage(f"BLOB {stream.vector.name} not sent",
+                           msgtype="WARN")
+            return
+
+        # a source failing midway is padded to the size already
+        # written, the element is always closed
+        for chunk in chunks:
+            self.writer.write(chunk)
+            await self.writer.drain()
+            # drain does not yield unless the pipe is full
+            await asyncio.sleep(0)
+
+        if errors:
+            logging.error(f"BLOB {stream.vector.name} was cut short "
+                          f"and padded with zeros: {errors[0]}")
+            self.IDMessage(f"BLOB {stream.vector.name} was cut short",
+                           msgtype="WARN")
+
+    def _drop_stale(self, batch):
+        """
+        Replace the queued sets of a vector with a single set of
+        its current values, in place of the last one. Defs, BLOBs,
+        messages and sets with a message are kept.
+        """
+        last = {}
+        count = {}
+        for i, item in enumerate(batch):
+            if isinstance(item, _QueuedSet):
+                last[id(item.vector)] = i
+                count[id(item.vector)] = count.get(id(item.vector), 0) + 1
+
+        kept = []
+        for i, item in enumerate(batch):
+            if not isinstance(item, _QueuedSet) or count[id(item.vector)] == 1:
+                kept.append(item)
+            elif last[id(item.vector)] == i:
+                kept.append(etree.tostring(item.vector.Set()))
+            else:
+                item.owner._output_state(item.vector.name).suppressed += 1
+
+        if len(kept) < len(batch):
+            logging.debug("output above %d bytes, dropped %d stale sets",
+                          self.output_high_water, len(batch) - len(kept))
+        return kept
 
     async def run(self):
         """
-        Read stdin and try to parse as xml
+        Read stdin in large chunks and feed them to an incremental
+        parser. Every complete top-level element is handed to dispatch,
+        however the messages are split across reads or lines.
 
         TODO: Create a real condition for the
         while loop. IT would be nice to be able
         to shutdown gracefully.
         """
 
-        inp = ""
-        while self.running:
+        async for messages in read_messages(
+                self.reader, self.read_width, self.max_blob_upload,
+                self.blob_upload_memory, self.blob_upload_dir):
+            if self.coalesce_new and len(messages) > 1:
+                messages = self.coalesce(messages)
+            for ele in messages:
+                await self.dispatch(ele)
 
-            inp += (await self.reader.readline()).decode()
-            try:
-                # TODO: This should be done with a feed parser
-                xml = etree.fromstring(inp)
-                inp = ""
-
-            except etree.XMLSyntaxError as error:
-                # This is not the best way to check
-                # for completed xml.
-                logging.debug(f"Could not parse xml {error} {inp}")
+            if not self.running:
+                break
+        else:
+            self.running = False
+
+    @staticmethod
+    def feed_parser():
+        """
+        Incremental parser for the driver input. The INDI stream has no
+        root element so we feed a fake one.
+        """
+        return feed_parser()
+
+    @staticmethod
+    def coalesce(messages):
+        """
+        Merge the newNumberVector messages for the same property into
+        the newest one, which takes the members it lacks from the
+        older ones. The other messages are left as they are: the
+        switch commands must keep their order (CONNECT then
+        DISCONNECT is not both On), uploads are handled one by one.
+        """
+        merged = []
+        newest = {}
+        for ele in reversed(messages):
+            if ele.tag != "newNumberVector":
+                merged.append(ele)
+                continue
+
+            key = (ele.tag, ele.get("device"), ele.get("name"))
+            if key not in newest:
+                newest[key] = (ele, {child.get("name") for child in ele})
+                merged.append(ele)
                 continue
 
+            # an older message, keep only what the newer ones lack
+            target, names = newest[key]
+            for child in list(ele):
+                if child.get("name") not in names:
+                    names.add(child.get("name"))
+                    target.append(child)
+
+        merged.reverse()
+        if len(merged) < len(messages):
+            logging.debug(f"coalesced {len(messages)} messages into {len(merged)}")
+        return merged
+
+    def build_dispatch(self):
+        """
+        The handlers of the client messages keyed by (tag, property
+        name), a None name matches any property. NewVectorProperty
+        handlers take precedence over the ISNewXXX methods.
+        """
+        table = {
+            ("getProperties", None): self._getProperties,
+            ("enableBLOB", None): self._enableBLOB,
+            ("newNumberVector", None): self._newNumber,
+            ("newTextVector", None): self._newText,
+            ("newSwitchVector", None): self._newSwitch,
+            ("newBLOBVector", None): self._newBLOB,
+        }
+
+        for name, func in self._NewPropertyMethods.items():
+            handler = functools.partial(self._newProperty, func)
+            for tag in ("newNumberVector", "newTextVector",
+                        "newSwitchVector", "newBLOBVector"):
+                table[(tag, name)] = handler
+
+        return table
+
+    async def dispatch(self, xml):
+        """Handle one message from the client"""
+
+        if logging.getLogger().isEnabledFor(logging.INFO):
             logging.info("Parsed data from client")
-            logging.info(etree.tostring(xml, pretty_print=True).decode())
+            logging.info(etree.tostring(
+                getattr(xml, "element", xml), pretty_print=True).decode())
             logging.info("End client data")
 
-            if xml.tag == "getProperties":
+        if xml.tag == "getProperties" or xml.tag.startswith("new"):
+            self.client_activity()
+
+        table = self._dispatch_table
+        handler = table.get((xml.tag, xml.get("name")))
+        if handler is None:
+            handler = table.get((xml.tag, None))
+        if handler is None or isinstance(xml, _NewBLOBMessage) \
+                and not self._accept_upload(xml):
+            if handler is None:
+                logging.debug(f"no handler for {xml.tag} {xml.get('name')}")
+            if isinstance(xml, _NewBLOBMessage):
+                xml.close()
+            return
+
+        watchdog = self._watchdog
+        try:
+            if watchdog is not None:
+                watchdog.enter(self, f"{xml.tag} {xml.get('name')}")
+            try:
+                result = handler(xml)
+            finally:
+                if watchdog is not None:
+                    watchdog.leave()
+            if isinstance(xml, _NewBLOBMessage):
+                result = self._release_uploads(xml, result)
+            if result is not None and inspect.isawaitable(result):
+                if xml.tag.startswith("new"):
+                    self.start_handler(xml.get("device"), xml.get("name"), result)
+                else:
+                    await result
+        except Exception as error:
+            logging.debug(f"{error}")
+            logging.debug(etree.tostring(getattr(xml, "element", xml)))
+            raise
+
+    def _accept_upload(self, xml):
+        """False, and the property in Alert, if an upload failed"""
+        errors = xml.errors()
+        if not errors:
+            return True
+
+        message = "; ".join(errors)
+        logging.error(f"upload to {xml.get('device')} {xml.get('name')} refused: {message}")
+        try:
+            vec = self.IUFind(xml.get("name"), xml.get("device"))
+        except ValueError:
+            return False
+        vec.state = IPState.ALERT
+        self.IDSet(vec, message)
+        return False
 
-                if "device" in xml.attrib:
-                    self.ISGetProperties(xml.attrib['device'])
+    def _release_uploads(self, xml, result):
+        """
+        The uploaded data lives as long as the handler, delete the
+        temporary files when it returns or, for a coroutine, when
+        it finishes.
+        """
+        if result is None or not inspect.isawaitable(result):
+            xml.close()
+            return result
 
-                else:
-                    self.ISGetProperties()
+        async def release():
+            try:
+                return await result
+            finally:
+                xml.close()
 
-                self.initProperties()
+        return release()
 
-                # maybe we should run this concurrently
-                # with gather. If it blocks this run loop
-                # it will be difficult to debug.
-                if "device" in xml.attrib:
-                    await self.asyncInitProperties(xml.attrib['device'])
-                else:
-                    await self.asyncInitProperties()
+    def start_handler(self, device, name, coro):
+        """
+        Run the coroutine of an async ISNewXXX or NewVectorProperty
+        handler as a task so that reading the client goes on. See
+        run_handler.
+        """
+        task = asyncio.ensure_future(self.run_handler(device, name, coro))
+        self._handler_tasks.add(task)
+        task.add_done_callback(self._handler_tasks.discard)
+        return task
+
+    async def run_handler(self, device, name, coro):
+        """
+        Await the handler coroutine for the property name after the
+        ones already started for it, with at most max_handlers running
+        for the whole device. The property is Busy while the handler
+        runs, Ok if the handler leaves it Busy and Alert if it raises.
+        """
+        if self._handler_slots is None:
+            self._handler_slots = asyncio.Semaphore(self.max_handlers)
 
-                if self._once:
-                    # This is where the `repeat` decorated
-                    # functions are called the first time
-                    for reg in self._registrants:
+        lock = self._handler_locks.get((device, name))
+        if lock is None:
+            lock = self._handler_locks[(device, name)] = asyncio.Lock()
 
-                        initiate_callback = getattr(self, reg.__name__)
-                        # initiate_callback is actually the 'get_instance'
-                        # function defined in device.repeat.
-                        initiate_callback()
+        async with lock, self._handler_slots:
+            try:
+                vec = self.IUFind(name, device)
+            except ValueError:
+                vec = None
 
-                    self._once = False
+            if vec is not None:
+                vec.state = IPState.BUSY
+                self.IDSet(vec)
 
-            elif xml.attrib['name'] in self._NewPropertyMethods:
-                names = [ele.attrib["name"] for ele in xml]
-                if "Number" in xml.tag:
-                    values = [float(ele.text.strip()) for ele in xml]
-                else:
-                    values = [str(ele.text.strip()) for ele in xml]
+            try:
+                await coro
+            except Exception as error:
+                logging.error(f"handler of {device} {name} failed: {error}")
+                traceback.print_exc(file=sys.stderr)
+                if vec is not None:
+                    vec.state = IPState.ALERT
+                    self.IDSet(vec, f"{error}")
+            else:
+                if vec is not None and vec.state == IPState.BUSY:
+                    vec.state = IPState.OK
+                    self.IDSet(vec)
 
-                self._NewPropertyMethods[xml.attrib['name']](
-                    self,
-                    xml.attrib["device"],
-                    xml.attrib['name'],
-                    values,
-                    names
-                )
+    async def _getProperties(self, xml):
 
-            elif xml.tag == "newNumberVector":
+        if "device" in xml.attrib:
+            self.ISGetProperties(xml.attrib['device'])
 
-                try:
-                    names = [ele.attrib["name"] for ele in xml]
-                    values = [float(ele.text.strip()) for ele in xml]
-                    self.ISNewNumber(
-                        xml.attrib["device"],
-                        xml.attrib["name"],
-                        values,
-                        names)
-
-                except Exception as error:
-                    logging.debug(f"{error}")
-                    logging.debug(etree.tostring(xml))
-                    raise
+        else:
+            self.ISGetProperties()
 
-            elif xml.tag == "newTextVector":
-                try:
-                    names = [ele.attrib["name"] for ele in xml]
-                    values = [str(ele.text) for ele in xml]
-                    self.ISNewText(
-                        xml.attrib["device"],
-                        xml.attrib["name"], values, names)
-                except Exception as error:
-                    logging.debug(f"{error}")
-                    logging.debug(etree.tostring(xml))
-                    raise
+        if self._watchdog is not None:
+            self._watchdog.define(self)
 
-            elif xml.tag == "newSwitchVector":
-                try:
-                    names = [ele.attrib["name"] for ele in xml]
-                    # values = [ISState.fromstring(ele.text) for ele in xml]
-                    values = [str(ele.text).strip() for ele in xml]
-                    self.ISNewSwitch(
-                        xml.attrib["device"],
-                        xml.attrib["name"],
-                        values,
-                        names)
-                except Exception as error:
-                    logging.debug(f"{error}")
-                    logging.debug(etree.tostring(xml))
-                    raise
+        self.initProperties()
+
+        # maybe we should run this concurrently
+        # with gather. If it blocks this run loop
+        # it will be difficult to debug.
+        if "device" in xml.attrib:
+            await self.asyncInitProperties(xml.attrib['device'])
+        else:
+            await self.asyncInitProperties()
+
+        if self._once:
+            # This is where the `repeat` decorated
+            # functions are called the first time
+            for reg in self._registrants:
+                settings = getattr(reg, "_repeat", None)
+                if settings is not None:
+                    self.start_repeat(reg, **settings)
+                else:
+                    # registered by hand with register
+                    getattr(self, reg.__name__)()
+
+            self._once = False
+
+    def _enableBLOB(self, xml):
+        self.ISEnableBLOB(
+            xml.attrib.get("device", self._devname),
+            xml.attrib.get("name"),
+            (xml.text or "").strip())
+
+    def _newProperty(self, func, xml):
+        names = [ele.attrib["name"] for ele in xml]
+        if "Number" in xml.tag:
+            values = [float(ele.text.strip()) for ele in xml]
+        elif isinstance(xml, _NewBLOBMessage):
+            values = [upload.value for upload in xml.uploads]
+        else:
+            values = [str(ele.text.strip()) for ele in xml]
+
+        return func(
+            self,
+            xml.attrib["device"],
+            xml.attrib['name'],
+            values,
+            names
+        )
+
+    def _newNumber(self, xml):
+        names = []
+        values = []
+        for ele in xml:
+            names.append(ele.attrib["name"])
+            # float() ignores the surrounding whitespace
+            values.append(float(ele.text))
+        return self.ISNewNumber(
+            xml.attrib["device"],
+            xml.attrib["name"],
+            values,
+            names)
+
+    def _newText(self, xml):
+        names = [ele.attrib["name"] for ele in xml]
+        values = [str(ele.text) for ele in xml]
+        return self.ISNewText(
+            xml.attrib["device"],
+            xml.attrib["name"], values, names)
+
+    def _newSwitch(self, xml):
+        names = [ele.attrib["name"] for ele in xml]
+        # values = [ISState.fromstring(ele.text) for ele in xml]
+        values = [str(ele.text).strip() for ele in xml]
+        return self.ISNewSwitch(
+            xml.attrib["device"],
+            xml.attrib["name"],
+            values,
+            names)
+
+    def _newBLOB(self, xml):
+        uploads = xml.uploads
+        return self.ISNewBLOB(
+            xml.attrib["device"],
+            xml.attrib["name"],
+            [upload.value for upload in uploads],
+            [upload.name for upload in uploads],
+            [upload.format for upload in uploads])
+
+    def ISNewBLOB(self, device: str, name: str, values: list,
+                  names: list, formats: list):
+        """
+        A client uploaded BLOBs. values are memoryviews of the
+        decoded data, or the Paths of temporary files for data
+        above blob_upload_memory bytes, already inflated if it
+        was sent compressed (formats lack the ".z" then). They
+        are only valid until the handler returns, or finishes
+        for a coroutine, move or copy what must be kept.
+        """
+        logging.warning(f"{self._devname} does not accept BLOB uploads, "
+                        f"{name} ignored")
+
+    def ISEnableBLOB(self, device: str, name: str, policy: str):
+        """
+        Record an enableBLOB message, name is None for the whole
+        device. Never stops IDSetBLOB for the property, Also and
+        Only let it through.
+        """
+        if policy not in ("Never", "Also", "Only"):
+            logging.warning(f"enableBLOB {policy} for {device} {name} ignored")
+            return
+
+        if name is None:
+            # a device wide setting replaces the per property ones
+            for key in [k for k in self._blob_policy if k[0] == device]:
+                del self._blob_policy[key]
+        self._blob_policy[(device, name)] = policy
+
+    def blob_wanted(self, name: str, device: str = None):
+        """
+        False if enableBLOB Never was received for the property or
+        its device. Drivers can check it before producing a BLOB.
+        Without any enableBLOB BLOBs are wanted.
+        """
+        if device is None:
+            device = self._devname
+        policy = self._blob_policy.get((device, name))
+        if policy is None:
+            policy = self._blob_policy.get((device, None), "Also")
+        return policy != "Never"
 
     def initProperties(self):
         """"""
@@ -1088,38 +3041,27 @@ class device(ABC):
         args:
             skelfile: string path to skeleton
             file.
-        """
-
-        ok_tags = (
-            "defSwitchVector",
-            "defTextVector",
-            "defNumberVector",
-            "defBLOBVector",
-            "defLightVector",
-        )
-
-        with open(skelfile) as skfd:
-            xmlstr = skfd.read()
-            xml = etree.fromstring(xmlstr)
 
-        for xml_def in xml.getchildren():
-            if xml_def.tag not in ok_tags:
-                # Ignore anything not a vector definition.
-                continue
-            properties = []
-            for prop in xml_def.getchildren():
-
-                att = prop.attrib
-                att.update({'value': prop.text.strip()})
-                properties.append(att)
-            try:
-                ivec = self.vectorFactory(xml_def.tag, xml_def.attrib, properties)
-            except Exception as error:
-                logging.error(f"The following error was caused by this xml tag \
-                        \n {etree.tostring(xml_def)}")
-                logging.error(error)
-                raise
-            self.IDDef(ivec)
+        The skeleton is compiled once and cached next to it, see
+        compile_skeleton, the def messages of the new vectors come
+        from the cache too. Vectors already defined are not built
+        again, a later call (initProperties runs at every
+        getProperties) defines them again with their current
+        values. All the definitions are queued as one write.
+        """
+        output = []
+        for tag, attribs, properties, xml in compile_skeleton(skelfile):
+            vec = self._props_index.get((attribs.get("device"), attribs.get("name")))
+            if vec is None:
+                vec = self.vectorFactory(
+                    tag, dict(attribs), [dict(prop) for prop in properties])
+                self._register(vec)
+                vec._mark_sent(vec.iprops)
+                output.append(xml.encode())
+            else:
+                output.append(self._define(vec))
+
+        self.outq.put_nowait(b"".join(output))
 
     def ISNewNumber(self, dev: str, name: str, values: list, names: list):
         raise NotImplementedError(
@@ -1137,18 +3079,36 @@ class device(ABC):
         if device is None:
             device = self._devname
 
-        for p in self.props:
-            if p.name == name and p.device == device:
-                if group is not None:
-                    if p.group == group:
-                        return p
-                else:
-                    return p
+        p = self._props_index.get((device, name))
+        if p is None:
+            # appended to self.props by hand
+            for p in self.props:
+                if p.name == name and p.device == device:
+                    self._index_prop(p)
+                    break
+            else:
+                p = None
+
+        if p is not None and (group is None or p.group == group):
+            return p
 
         # We could let this return None but not finding a
         # property seems to be a pretty important issue.
         raise ValueError(f"Could not find {device}, {name} in props")
 
+    def IUGroup(self, group):
+        """The vector properties defined in group, in definition order"""
+        return list(self._groups.get(group, {}).values())
+
+    def _index_prop(self, prop):
+        key = (prop.device, prop.name)
+        old = self._props_index.get(key)
+        if old is not None:
+            self._groups.get(old.group, {}).pop(prop.name, None)
+
+        self._props_index[key] = prop
+        self._groups.setdefault(prop.group, {})[prop.name] = prop
+
     def IUUpdate(self, device, name, values, names, Set=False):
         """
         Update the indi vector property. It looks up
@@ -1198,37 +3158,155 @@ class device(ABC):
         elif timestamp is None:
             timestamp = datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
 
-        xml = f'<message message="[{msgtype}] {msg}" '
+        msg = escape(f"[{msgtype}] {msg}", {'"': "&quot;"})
+        xml = f'<message message="{msg}" '
         xml += f'timestamp="{timestamp}" '
         xml += f'device="{self.name()}"/> '
 
         self.outq.put_nowait(xml.encode())
         # self.writer.write(xml.encode())
 
-    def IDSetNumber(self, n: INumberVector, msg=None):
-        self.IDSet(n, msg)
+    def IDSetNumber(self, n: INumberVector, msg=None, force=False):
+        """IDSet of a number vector: changed members only unless force"""
+        self.IDSet(n, msg, force)
 
-    def IDSetText(self, t: ITextVector, msg=None):
-        self.IDSet(t, msg)
+    def IDSetText(self, t: ITextVector, msg=None, force=False):
+        """IDSet of a text vector: changed members only unless force"""
+        self.IDSet(t, msg, force)
 
-    def IDSetLight(self, ll: ILightVector, msg=None):
-        self.IDSet(ll, msg)
+    def IDSetLight(self, ll: ILightVector, msg=None, force=False):
+        """IDSet of a light vector: changed members only unless force"""
+        self.IDSet(ll, msg, force)
 
-    def IDSetSwitch(self, s: ISwitchVector, msg=None):
-        self.IDSet(s, msg)
+    def IDSetSwitch(self, s: ISwitchVector, msg=None, force=False):
+        """IDSet of a switch vector: changed members only unless force"""
+        self.IDSet(s, msg, force)
 
-    def IDSet(self, vector: IVectorProperty, msg=None):
+    def IDSet(self, vector: IVectorProperty, msg=None, force=False):
+        """
+        Send the members of vector that changed since it was last
+        defined or set. Nothing is sent if neither the members nor
+        the state changed and there is no msg, unless force is True
+        in which case every member is sent at once.
+
+        If the property has an OutputPolicy, updates below its
+        deadband are dropped and updates above its rate are held
+        back and sent later through outq, see set_output_policy.
+        """
         if isinstance(vector, IBLOB) or isinstance(vector, IBLOBVector):
             raise RuntimeError("Must use IDSetBLOB to send BLOB to client.")
-        self.outq.put_nowait(etree.tostring(vector.Set(msg), pretty_print=True))
-        # self.writer.write(etree.tostring(vector.Set(msg), pretty_print=True))
 
-    def IDSetBLOB(self, blob):
-        self.outq.put_nowait(etree.tostring(blob.Set()))
-        # self.writer.write(etree.tostring(blob.Set()))
+        policy = self._output_policies.get(vector.name)
+        if policy is None or force:
+            self._emit(vector, msg, force)
+            return
+
+        out = self._output_state(vector.name)
+        urgent = msg is not None or vector.state_changed()
+        if not urgent and not any(
+                policy.significant(prop, sent) for prop, sent in vector.changes()):
+            out.suppressed += 1
+            return
+
+        if out.msg is not None and msg is None:
+            msg = out.msg
+
+        wait = 0.0
+        if out.last_emit is not None:
+            wait = out.last_emit + policy.min_interval - time.monotonic()
+
+        if urgent or wait <= 0:
+            if out.handle is not None:
+                out.handle.cancel()
+                out.handle = None
+            out.msg = None
+            self._emit(vector, msg)
+            return
+
+        # inside the rate window, the pending flush sends the latest values
+        out.suppressed += 1
+        out.msg = msg
+        if out.handle is None:
+            loop = self.mainloop or asyncio.get_event_loop()
+            out.handle = loop.call_later(wait, self._flush_output, vector)
+
+    def _flush_output(self, vector: IVectorProperty):
+        out = self._output_state(vector.name)
+        msg, out.msg, out.handle = out.msg, None, None
+        self._emit(vector, msg)
+
+    def _emit(self, vector: IVectorProperty, msg=None, force=False):
+        out = self._output_state(vector.name)
+        ele = vector.Set(msg, changed_only=not force)
+        if ele is None:
+            out.suppressed += 1
+            return
+        if msg is None:
+            output = _QueuedSet(etree.tostring(ele))
+            output.vector = vector
+            output.owner = self
+        else:
+            output = etree.tostring(ele)
+        self.outq.put_nowait(output)
+        out.emitted += 1
+        self._emitted += 1
+        out.last_emit = time.monotonic()
+
+    def _output_state(self, name):
+        out = self._output.get(name)
+        if out is None:
+            out = self._output[name] = _OutputState()
+        return out
+
+    def set_output_policy(self, name: str, policy: OutputPolicy = None):
+        """
+        Change the OutputPolicy of the property name for this
+        device, None sends every update as it comes. The class
+        attribute output_policy holds the initial policies.
+        """
+        if policy is None:
+            # a set already held back is still flushed
+            self._output_policies.pop(name, None)
+        else:
+            self._output_policies[name] = policy
+
+    def output_stats(self):
+        """{property name: (emitted, suppressed)} counts of IDSet calls"""
+        return {name: (out.emitted, out.suppressed)
+                for name, out in self._output.items()}
+
+    def IDSetBLOB(self, blob, msg=None):
+        """
+        Queue the BLOB vector for the indiserver. The data is
+        base64 encoded while it is written, see IBLOB.value for
+        the accepted sources. Nothing is done if nobody wants
+        the BLOB, see blob_wanted.
+
+        With blob.compression set, the members are zlib compressed
+        in a worker thread and sent with a ".z" format when that
+        makes them smaller.
+        """
+        if not self.blob_wanted(blob.name, blob.device):
+            self._output_state(blob.name).suppressed += 1
+            return
+        self.outq.put_nowait(_BLOBStream(blob, msg, self.mainloop))
+        self._emitted += 1
 
     def IDDef(self, prop, msg=None):
 
+        # Send it to the indiserver
+        self.outq.put_nowait(self._define(prop, msg))
+
+    def IDDefs(self, props, msg=None):
+        """IDDef every vector of props in a single write"""
+        self.outq.put_nowait(b"".join([self._define(prop, msg) for prop in props]))
+
+    def _define(self, prop, msg=None):
+        self._register(prop)
+        return etree.tostring(prop.Def(msg), pretty_print=True)
+
+    def _register(self, prop):
+
         # register the property internally
 
         if prop.device != self._devname:
@@ -1236,80 +3314,225 @@ class device(ABC):
                 f"INDI prop {prop.name} device does not match this device, {prop.device} {self._devname}"
             )
 
-        if prop not in self.props:
+        old = self._props_index.get((prop.device, prop.name))
+        if old is None:
             self.props.append(prop)
-        # Send it to the indiserver
-        self.outq.put_nowait((etree.tostring(prop.Def(msg), pretty_print=True)))
+        elif old is not prop:
+            # defined again with a new object, replace the old one
+            self.props[self.props.index(old)] = prop
 
-        # self.writer.write((etree.tostring(prop.Def(msg), pretty_print=True)))
+        if old is not prop:
+            self._index_prop(prop)
 
     @classmethod
     def NewVectorProperty(cls, name: str):
+        """
+        Decorator for the method handling new values of the
+        property name, instead of ISNewXXX. The method is
+        registered by the class it is defined in; a function
+        decorated outside a class body by the subclass the
+        decorator is called on.
+        """
 
         def get_function(func: Callable):
 
-            cls._NewPropertyMethods[name] = func
+            func._new_property = name
+            if cls is not device and not _in_class_body(func):
+                # decorated after the class was made, a method of a
+                # class body is collected by its own __init_subclass__
+                cls._NewPropertyMethods[name] = func
             return func
 
         return get_function
 
     @classmethod
-    def repeat(cls, millis: int):
+    def repeat(cls, millis: int, overrun: str = "skip",
+               max_millis: int = None, stretch: float = 2.0):
         """This monstrosity is a decorator
         for methods that are to be called
         after the first ISGetProperties is called
-        and then repeated every millis [ms]"""
+        and then repeated every millis [ms].
+
+        The calls are due at fixed times, a slow
+        call does not shift the next ones. For a
+        coroutine method still running when the
+        next call is due, overrun is 'skip',
+        'queue' or 'concurrent', see _RepeatJob.
+        The period can be changed at runtime with
+        set_repeat_period.
+
+        With max_millis the polling is adaptive:
+        while the device is idle (see idle) and a
+        call changes nothing the period grows by
+        stretch up to max_millis. It snaps back to
+        millis when a call changes something and
+        when a client sends getProperties or a new
+        value. A call changed something if it
+        returns True, or, when it returns None,
+        if the device sent a set meanwhile."""
+
+        if overrun not in ("skip", "queue", "concurrent"):
+            raise ValueError(
+                f"overrun must be 'skip', 'queue' or 'concurrent' not {overrun}")
 
         def get_function(func: Callable):
             """"Called during class definition.
-            Nested functions hereafter are called
-            when func is called.
+            Mark the function, the class registers
+            it and each instance starts it when
+            ISGetProperties is called first.
             """
-            # Register the function with
-            # the class so we know to call
-            # it when in ISGetProperties
-            # is called
-            cls.register(func)
-
-            def get_instance(instance: device):
-                """
-                Set the function to be called with call_later
-                asyncio procedure.
-
-                Called after ISGetProperties is called
-                in device.run
-                """
-
-                @functools.wraps(func)
-                def call_with_error_handling():
-                    """Call the function but make sure
-                    we have error handling with the traceback"""
-
-                    instance.repeat_q.put_nowait(func)
-
-                    # do it again in millis
-                    cl = instance.mainloop.call_later(
-                        millis / 1000.0,
-                        call_with_error_handling)
-                    instance.handles.append(cl)
-                    return
-
-                # The below line calls the wrapped
-                # function for the first time
-                cl = instance.mainloop.call_later(
-                    millis / 1000.0,
-                    call_with_error_handling)
-
-                instance.handles.append(cl)
-                return
+            func._repeat = dict(
+                millis=millis, overrun=overrun,
+                max_millis=max_millis, stretch=stretch)
+            if cls is not device and not _in_class_body(func):
+                # decorated after the class was made
+                cls.register(func)
+            return func
+
+        return get_function
+
+    def start_repeat(self, func: Callable, millis: int, overrun: str = "skip",
+                     max_millis: int = None, stretch: float = 2.0):
+        """Call func(self) every millis [ms], see repeat"""
+        job = self._repeats.get(func.__name__)
+        if job is not None:
+            job.cancel()
+        job = self._repeats[func.__name__] = _RepeatJob(
+            self, func, millis / 1000.0, overrun,
+            None if max_millis is None else max_millis / 1000.0, stretch)
+        job.start()
+        return job
+
+    def idle(self):
+        """True if no client sent getProperties or new*Vector lately"""
+        return time.monotonic() - self.last_client_activity > self.idle_after
+
+    def client_activity(self):
+        """A client showed interest, adaptive repeats go full rate"""
+        self.last_client_activity = time.monotonic()
+        for job in self._repeats.values():
+            job.wake()
+
+    def set_repeat_period(self, name: str, millis: int):
+        """
+        Change the period of the repeat decorated method name,
+        e.g. from a POLLING_PERIOD property. The next call is due
+        millis [ms] from now.
+        """
+        job = self._repeats[name]
+        job.period = job.base_period = millis / 1000.0
+        if job.max_period is not None:
+            job.max_period = max(job.max_period, job.period)
+        job.start()
+
+    def repeat_stats(self):
+        """
+        {method name: stats} of the repeat decorated methods, times
+        are in seconds. lateness is how late a call started.
+        """
+        return {name: job.stats() for name, job in self._repeats.items()}
 
-            return get_instance
+    def stop_repeats(self):
+        for job in self._repeats.values():
+            job.cancel()
+
+    @classmethod
+    def offload(cls, pool: str = "thread"):
+        """
+        Decorator for CPU bound functions of the device class.
+        Calling them on the device returns an awaitable that runs
+        them in a pool owned by the device, the event loop keeps
+        serving the other properties meanwhile.
+
+        The function is written without self, like a staticmethod,
+        for both pools: it gets the arguments of the call only, so
+        switching pool does not change its signature.
+
+        pool='thread' runs it in a thread.
+        pool='process' runs it in a worker process, started by
+        forkserver (spawn where there is none), so the function
+        must be reachable by name from its module and a driver
+        script starts the device under if __name__ == "__main__".
+        A numpy array it returns comes back through shared memory.
+        """
+        if pool not in ("thread", "process"):
+            raise ValueError(f"pool must be 'thread' or 'process' not {pool}")
+
+        def get_function(func: Callable):
+            params = list(inspect.signature(func).parameters)
+            if params and params[0] == "self":
+                raise TypeError(
+                    f"{func.__qualname__}: offload functions take no self")
+
+            @functools.wraps(func)
+            async def run_offloaded(self, *args, **kwargs):
+                loop = asyncio.get_running_loop()
+                if pool == "thread":
+                    call = functools.partial(func, *args, **kwargs)
+                else:
+                    call = functools.partial(
+                        _offload_call, func.__module__, func.__qualname__,
+                        args, kwargs)
+
+                future = self.executor(pool).submit(call)
+                self._offloaded.add(future)
+                try:
+                    result = await asyncio.wrap_future(future, loop=loop)
+                except asyncio.CancelledError:
+                    future.add_done_callback(_release_shared)
+                    raise
+                finally:
+                    owned = future in self._offloaded
+                    self._offloaded.discard(future)
+
+                if not owned:
+                    # shutdown_pools took it over meanwhile
+                    raise asyncio.CancelledError()
+                if isinstance(result, _SharedArray):
+                    result = result.load()
+                return result
+
+            return run_offloaded
 
         return get_function
 
+    def executor(self, pool: str = "thread"):
+        """The thread or process pool of the device, see offload"""
+        executor = self._pools.get(pool)
+        if executor is None:
+            if pool == "process":
+                # fork would copy the locks the threads of the
+                # driver hold, the workers start from a clean process
+                if "forkserver" in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context("forkserver")
+                else:
+                    context = multiprocessing.get_context("spawn")
+                executor = ProcessPoolExecutor(
+                    self.offload_workers, mp_context=context)
+            else:
+                executor = ThreadPoolExecutor(
+                    self.offload_workers, thread_name_prefix=self._devname)
+            self._pools[pool] = executor
+        return executor
+
+    def shutdown_pools(self):
+        # executor.shutdown(cancel_futures=True) needs python 3.9,
+        # the results of the calls still running are released
+        for future in list(self._offloaded):
+            future.cancel()
+            future.add_done_callback(_release_shared)
+        self._offloaded.clear()
+        for executor in self._pools.values():
+            executor.shutdown(wait=False)
+        self._pools.clear()
+
     @classmethod
     def register(cls, registrant: Callable):
-        """Register the function """
+        """Register the function, instances made afterwards
+        call getattr(instance, registrant.__name__)() when
+        ISGetProperties is called first."""
+        if "_registrants" not in vars(cls):
+            cls._registrants = list(cls._registrants)
         cls._registrants.append(registrant)
 
     @staticmethod
@@ -1375,3 +3598,146 @@ class device(ABC):
             raise ValueError(message)
 
         return vec
+
+
+class DeviceHost:
+    """
+    Run several devices in one event loop over one stdin/stdout
+    pair, like several drivers in one process. Every device keeps
+    its own properties, handlers, timers and output conflation,
+    they only share the reader, the writer and the output queue.
+
+    Messages with a device attribute go to that device only,
+    messages without one (getProperties) go to all of them.
+
+    Usage:
+        host = DeviceHost(Camera(name="CCD 1"), Camera(name="CCD 2"),
+                          Focuser())
+        host.start()
+    """
+
+    def __init__(self, *devices):
+        self.devices = {}
+        for dev in devices:
+            self.add(dev)
+
+        self.read_width = 2**16
+        # see device.max_blob_upload
+        self.max_blob_upload = 2**30
+        self.blob_upload_memory = 2**20
+        self.blob_upload_dir = None
+        # one watchdog for the loop of all the devices, see
+        # device.watchdog_threshold
+        self.watchdog_threshold = None
+        self.watchdog_interval = 0.05
+        self.running = False
+
+    def add(self, dev):
+        """Add a device, names must be unique in the host"""
+        if dev.device in self.devices:
+            raise ValueError(f"device {dev.device} already in the host")
+
+        self.devices[dev.device] = dev
+
+    def __getitem__(self, name):
+        return self.devices[name]
+
+    def __iter__(self):
+        return iter(self.devices.values())
+
+    def _connect(self, loop, reader, writer):
+        """Point every device to the shared streams and output queue"""
+        if not self.devices:
+            raise ValueError("no device in the host")
+
+        outq = asyncio.Queue()
+        for dev in self:
+            dev.mainloop = loop
+            dev.reader, dev.writer = reader, writer
+            dev.outq = outq
+            dev.running = True
+
+        self.running = True
+
+    def _tasks(self):
+        # one writer drains the shared queue
+        writer = next(iter(self))
+        return (self.watchdog(), self.run(), writer.toindiserver())
+
+    async def watchdog(self):
+        """Run the event loop watchdog, see watchdog_threshold"""
+        if self.watchdog_threshold is None:
+            return
+        await _run_watchdog(self, list(self), self.watchdog_threshold,
+                            self.watchdog_interval)
+
+    def _stop(self):
+        self.running = False
+        for dev in self:
+            dev.running = False
+            dev.stop_repeats()
+            dev.shutdown_pools()
+
+    def start(self):
+        """Blocking counterpart of astart, see device.start"""
+        loop = asyncio.get_event_loop()
+        self._connect(loop, *loop.run_until_complete(stdio()))
+        try:
+            loop.run_until_complete(asyncio.gather(*self._tasks()))
+        finally:
+            self._stop()
+
+    async def astart(self, *tasks, streams=None):
+        """Start up in async mode
+        Arg: tasks -> any coroutines that
+        should be run concurrently with the
+        devices.
+        streams -> (reader, writer) to use
+        instead of stdin and stdout.
+        """
+        if streams is None:
+            streams = await stdio()
+        self._connect(asyncio.get_running_loop(), *streams)
+        try:
+            await asyncio.gather(*self._tasks(), *tasks)
+        finally:
+            self._stop()
+
+    async def run(self):
+        """Read stdin and dispatch every message to its device"""
+        reader = next(iter(self)).reader
+        async for messages in read_messages(
+                reader, self.read_width, self.max_blob_upload,
+                self.blob_upload_memory, self.blob_upload_dir):
+            for dev, batch in self.route(messages).items():
+                if dev.coalesce_new and len(batch) > 1:
+                    batch = dev.coalesce(batch)
+                for ele in batch:
+                    await dev.dispatch(ele)
+
+            if not self.running:
+                break
+        else:
+            self.running = False
+            for dev in self:
+                dev.running = False
+
+    def route(self, messages):
+        """Split the messages by device, keeping their order"""
+        batches = {}
+        for ele in messages:
+            name = ele.get("device")
+            if name is None:
+                targets = self.devices.values()
+            elif name in self.devices:
+                targets = (self.devices[name],)
+            else:
+                logging.debug(f"no device {name} in the host, ignore {ele.tag}")
+                if isinstance(ele, _NewBLOBMessage):
+                    ele.close()
+                continue
+
+            for dev in targets:
+                batches.setdefault(dev, []).append(ele)
+
+        return batches
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+@File      :   pyindi/device/harness.py
+@Time      :   2023/03
+@Author    :   Stefano Sartor
+@Version   :   0.1
+@Contact   :   sartor@oavda.it
+@License   :   MIT
+@Copyright :   (C) 2023 FONDAZIONE CLÉMENT FILLIETROZ-ONLUS
+'''
+
+# Run a device in process, without indiserver nor a client.
+#
+# The harness starts the device (or a DeviceHost) with in-memory
+# streams instead of stdin/stdout, sends it getProperties and new*Vector
+# messages and parses its output into a client view of the properties.
+# It measures how long the handlers take to answer and how much the
+# device writes, e.g.
+#
+#     async with DriverHarness(MyDriver()) as harness:
+#         await harness.get_properties()
+#         latency = await harness.new("EXPOSURE", {"SECONDS": 1.0})
+#         print(harness["EXPOSURE"].state, harness.stats())
+
+import asyncio
+import base64
+import collections
+import statistics
+import time
+import zlib
+from xml.sax.saxutils import escape, quoteattr
+
+from lxml import etree
+
+from pyindi.core.indi_types import IPS, ISS
+
+
+class ClientVector:
+    """A vector property as a client sees it"""
+
+    def __init__(self, ele):
+        self.kind = ele.tag[3:-6]
+        self.device = ele.get('device')
+        self.name = ele.get('name')
+        self.attrib = dict(ele.attrib)
+        self.values = {}
+        self.formats = {}
+        self.state = None
+        self.sets = 0
+        self.updated = None
+        self.update(ele)
+
+    def __repr__(self):
+        return f'<{self.device}.{self.name}>{{{self.state} {self.values}}}'
+
+    def __getitem__(self, member):
+        return self.values[member]
+
+    def update(self, ele):
+        """apply a def or a set, a set may carry only some members"""
+        if ele.get('state') is not None:
+            self.state = IPS[ele.get('state')]
+        for key in ('timeout', 'timestamp', 'message'):
+            if ele.get(key) is not None:
+                self.attrib[key] = ele.get(key)
+
+        for child in ele:
+            self.values[child.get('name')] = self._value(child)
+        self.updated = time.monotonic()
+
+    def _value(self, child):
+        text = (child.text or '').strip()
+        if self.kind == 'Number':
+            return float(text)
+        if self.kind == 'Switch':
+            return ISS[text]
+        if self.kind == 'Light':
+            return IPS[text]
+        if self.kind == 'BLOB':
+            fmt = child.get('format', '')
+            data = base64.b64decode(text)
+            if fmt.endswith('.z'):
+                fmt, data = fmt[:-2], zlib.decompress(data)
+            self.formats[child.get('name')] = fmt
+            return data
+        return text
+
+
+class _MemoryWriter:
+    """Stands for stdout, the output goes to the harness"""
+
+    transport = None
+
+    def __init__(self, harness):
+        self.harness = harness
+
+    def write(self, data):
+        self.harness._received(data)
+
+    async def drain(self):
+        pass
+
+
+class DriverHarness:
+    """
+    Run dev, a device or a DeviceHost, with in-memory streams and
+    a client view of its output.
+
+    properties: (device, name) -> ClientVector, harness[name]
+        looks up a property of the first device.
+    messages: the (device, text) of the message elements.
+    latencies: property name -> seconds taken by each new().
+    """
+
+    def __init__(self, dev, timeout=5.0):
+        self.dev = dev
+        self.devname = dev.device if hasattr(dev, 'device') \
+            else next(iter(dev)).device
+        self.timeout = timeout
+        self.properties = {}
+        self.messages = []
+        self.latencies = collections.defaultdict(list)
+        self.reader = None
+        self.writer = None
+        self.task = None
+
+        self.bytes_out = 0
+        self.elements_out = collections.Counter()
+        self._parser = None
+        self._depth = 0
+        self._root = None
+        self._waiters = []
+        self._last_output = None
+        self._started = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def start(self):
+        self.reader = asyncio.StreamReader()
+        self.writer = _MemoryWriter(self)
+        self._parser = etree.XMLPullParser(events=('start', 'end'), huge_tree=True)
+        self._parser.feed(b'<root>')
+        self._started = time.monotonic()
+        self.task = asyncio.ensure_future(
+            self.dev.astart(streams=(self.reader, self.writer)))
+        # let the device reach its read loop
+        await asyncio.sleep(0)
+
+    async def stop(self):
+        """Close the input and stop the device"""
+        self.reader.feed_eof()
+        if not self.task.done():
+            self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+    def __getitem__(self, name):
+        return self.properties[(self.devname, name)]
+
+    def send(self, xml):
+        """Write xml (str or bytes) to the device as a client would"""
+        if isinstance(xml, str):
+            xml = xml.encode()
+        self.reader.feed_data(xml)
+
+    async def get_properties(self, device=None, name=None, quiet=0.05):
+        """Send getProperties and wait until the device stops writing"""
+        attrib = ' version="1.7"'
+        if device is not None:
+            attrib += f' device={quoteattr(device)}'
+        if name is not None:
+            attrib += f' name={quoteattr(name)}'
+        self.send(f'<getProperties{attrib}/>\n')
+        await self.settle(quiet)
+
+    async def settle(self, quiet=0.05):
+        """Wait until the device wrote nothing for quiet seconds"""
+        deadline = time.monotonic() + self.timeout
+        start = time.monotonic()
+        while True:
+            last = self._last_output or start
+            now = time.monotonic()
+            if now - last >= quiet and now - start >= quiet:
+                return
+            if now > deadline:
+                raise asyncio.TimeoutError('the device kept writing')
+            await asyncio.sleep(quiet / 5)
+
+    def new_xml(self, name, values, device=None):
+        """The new*Vector message for values {member: value}"""
+        vec = self.properties[(device or self.devname, name)]
+        tag, one = f'new{vec.kind}Vector', f'one{vec.kind}'
+        parts = [f'<{tag} device={quoteattr(vec.device)} name={quoteattr(name)}>']
+        for member, value in values.items():
+            attrib = f'name={quoteattr(member)}'
+            if vec.kind == 'BLOB':
+                data, fmt = value if isinstance(value, tuple) else (value, '.bin')
+                attrib += f' size="{len(data)}" format={quoteattr(fmt)}'
+                text = base64.b64encode(data).decode()
+            else:
+                text = escape(str(getattr(value, 'value', value)))
+            parts.append(f'<{one} {attrib}>{text}</{one}>')
+        parts.append(f'</{tag}>\n')
+        return ''.join(parts)
+
+    async def new(self, name, values, device=None, until=None):
+        """
+        Send new values to the property name and wait for the device
+        to answer. By default the answer is a set of the property
+        that is not Busy, until(vector) can decide otherwise. Returns
+        the latency in seconds, also kept in latencies.
+        """
+        key = (device or self.devname, name)
+        if until is None:
+            def until(vec):
+                return vec.state != IPS.Busy
+
+        start = time.monotonic()
+        sets = self.properties[key].sets
+        waiter = self.wait_for(
+            lambda vec: (vec.device, vec.name) == key
+            and vec.sets > sets and until(vec))
+        self.send(self.new_xml(name, values, device))
+        await waiter
+        latency = time.monotonic() - start
+        self.latencies[name].append(latency)
+        return latency
+
+    def wait_for(self, predicate, timeout=None):
+        """
+        Future of the first ClientVector updated from now on for
+        which predicate(vector) is true.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((predicate, future))
+        return asyncio.wait_for(future, timeout or self.timeout)
+
+    def _received(self, data):
+        self.bytes_out += len(data)
+        self._last_output = time.monotonic()
+        self._parser.feed(data)
+        for event, ele in self._parser.read_events():
+            if event == 'start':
+                self._depth += 1
+                if self._depth == 1:
+                    self._root = ele
+                continue
+
+            self._depth -= 1
+            if self._depth == 1:
+                self._root.remove(ele)
+                self._element(ele)
+
+    def _element(self, ele):
+        tag = ele.tag
+        self.elements_out[tag] += 1
+        key = (ele.get('device'), ele.get('name'))
+        if tag == 'message':
+            self.messages.append((ele.get('device'), ele.get('message')))
+            return
+        if tag == 'delProperty':
+            if ele.get('name') is None:
+                for other in [k for k in self.properties if k[0] == key[0]]:
+                    del self.properties[other]
+            else:
+                self.properties.pop(key, None)
+            return
+
+        if tag.startswith('def'):
+            vec = self.properties[key] = ClientVector(ele)
+        elif tag.startswith('set') and key in self.properties:
+            vec = self.properties[key]
+            vec.update(ele)
+            vec.sets += 1
+        else:
+            return
+
+        for waiter in list(self._waiters):
+            predicate, future = waiter
+            if future.done():
+                self._waiters.remove(waiter)
+            elif predicate(vec):
+                future.set_result(vec)
+                self._waiters.remove(waiter)
+
+    def stats(self):
+        """
+        Output counts and rates since start, and the handler
+        latencies per property (seconds).
+        """
+        elapsed = time.monotonic() - self._started
+        latencies = {}
+        for name, values in self.latencies.items():
+            ordered = sorted(values)
+            latencies[name] = dict(
+                count=len(ordered),
+                mean=statistics.fmean(ordered),
+                p50=ordered[len(ordered) // 2],
+                p99=ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+                max=ordered[-1])
+
+        nelements = sum(self.elements_out.values())
+        return dict(
+            elapsed=elapsed,
+            bytes=self.bytes_out,
+            elements=dict(self.elements_out),
+            bytes_per_second=self.bytes_out / elapsed,
+            elements_per_second=nelements / elapsed,
+            latency=latencies)
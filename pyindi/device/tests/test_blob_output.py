@@ -0,0 +1,42 @@
+import base64
+
+from lxml import etree
+
+from pyindi.device import IBLOBVector, IBLOB, IPState, IPerm
+
+
+def vector(value, size=None):
+    blob = IBLOB("img", ".bin")
+    blob.value = value
+    if size is not None:
+        blob.size = size
+    return IBLOBVector([blob], "D", "IMG", IPState.OK, IPerm.RO)
+
+
+def test_stream():
+    data = bytes(range(256)) * 1000
+    errors = []
+    vec = vector(data)
+    ele = etree.fromstring(b"".join(vec.stream_sources(
+        [blob.source(1000) for blob in vec.bp], errors=errors)))
+
+    assert ele.tag == "setBLOBVector"
+    assert ele[0].get("size") == str(len(data))
+    assert base64.b64decode(ele[0].text) == data
+    assert errors == []
+
+
+def test_failing_source_is_padded():
+    def chunks():
+        yield b"a" * 3000
+        raise OSError("disk gone")
+
+    errors = []
+    vec = vector(chunks(), size=9000)
+    output = b"".join(vec.stream_sources(
+        [blob.source(1000) for blob in vec.bp], errors=errors))
+    ele = etree.fromstring(output)
+
+    # the element is closed with the size announced in its start tag
+    assert base64.b64decode(ele[0].text) == b"a" * 3000 + bytes(6000)
+    assert [str(error) for error in errors] == ["disk gone"]
@@ -0,0 +1,30 @@
+from lxml import etree
+
+from pyindi.device import device
+
+
+def messages(*xml):
+    return [etree.fromstring(text) for text in xml]
+
+
+def test_numbers_are_merged():
+    merged = device.coalesce(messages(
+        '<newNumberVector device="D" name="POS">'
+        '<oneNumber name="RA">1</oneNumber><oneNumber name="DEC">2</oneNumber>'
+        '</newNumberVector>',
+        '<newNumberVector device="D" name="POS">'
+        '<oneNumber name="RA">3</oneNumber></newNumberVector>'))
+
+    assert len(merged) == 1
+    assert {one.get("name"): one.text for one in merged[0]} == {"RA": "3", "DEC": "2"}
+
+
+def test_switches_are_not_merged():
+    merged = device.coalesce(messages(
+        '<newSwitchVector device="D" name="CONNECTION">'
+        '<oneSwitch name="CONNECT">On</oneSwitch></newSwitchVector>',
+        '<newSwitchVector device="D" name="CONNECTION">'
+        '<oneSwitch name="DISCONNECT">On</oneSwitch></newSwitchVector>'))
+
+    assert [[(one.get("name"), one.text) for one in ele] for ele in merged] == [
+        [("CONNECT", "On")], [("DISCONNECT", "On")]]
@@ -0,0 +1,30 @@
+from pyindi.device import ISwitchVector, ISwitch, IPState, IPerm, ISRule
+
+
+def members(ele):
+    return [(child.get("name"), child.text) for child in ele]
+
+
+def test_changed_members_only():
+    vec = ISwitchVector([ISwitch(f"S{i}", "Off") for i in range(5)],
+                        "D", "SWITCHES", IPState.OK, ISRule.NOFMANY, IPerm.RW)
+    vec.Def()
+    assert vec.Set(changed_only=True) is None
+
+    vec.sp[3].value = "On"
+    ele = vec.Set("moved", changed_only=True)
+    assert members(ele) == [("S3", "On")]
+    assert ele.get("message") == "moved"
+
+    # the element is reused, the previous member and msg are gone
+    vec.sp[1].value = "On"
+    vec.state = IPState.BUSY
+    ele = vec.Set(changed_only=True)
+    assert members(ele) == [("S1", "On")]
+    assert ele.get("message") is None
+    assert ele.get("state") == "Busy"
+
+    # state only, the first member is carried
+    vec.state = IPState.OK
+    assert members(vec.Set(changed_only=True)) == [("S0", "Off")]
+    assert len(vec.Set()) == 5
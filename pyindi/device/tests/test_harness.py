@@ -0,0 +1,55 @@
+import asyncio
+
+from pyindi.core.indi_types import IPS, ISS
+from pyindi.device import (device, INumberVector, INumber, ISwitchVector,
+                           ISwitch, IPState, IPerm, ISRule)
+from pyindi.device.harness import DriverHarness
+
+
+class Focuser(device):
+
+    def ISGetProperties(self, device=None):
+        self.IDDef(INumberVector(
+            [INumber("POSITION", "%g", 0, 1000, 1, 10)],
+            self.device, "FOCUS", IPState.IDLE, IPerm.RW))
+        self.IDDef(ISwitchVector(
+            [ISwitch("IN", "On"), ISwitch("OUT", "Off")],
+            self.device, "DIRECTION", IPState.IDLE, ISRule.ONEOFMANY, IPerm.RW))
+
+    def ISNewNumber(self, device, name, values, names):
+        vec = self.IUUpdate(device, name, values, names)
+        vec.state = IPState.OK
+        self.IDSet(vec)
+
+    @device.NewVectorProperty("DIRECTION")
+    async def direction(self, device, name, values, names):
+        vec = self.IUUpdate(device, name, values, names)
+        vec.state = IPState.BUSY
+        self.IDSet(vec)
+        await asyncio.sleep(0.01)
+        vec.state = IPState.OK
+        self.IDSet(vec)
+
+
+def test_define_new_set():
+
+    async def drive():
+        async with DriverHarness(Focuser(name="F")) as harness:
+            await harness.get_properties()
+            assert sorted(harness.properties) == [("F", "DIRECTION"), ("F", "FOCUS")]
+            assert harness["FOCUS"]["POSITION"] == 10.0
+            assert harness["FOCUS"].state == IPS.Idle
+
+            await harness.new("FOCUS", {"POSITION": 42})
+            assert harness["FOCUS"]["POSITION"] == 42.0
+            assert harness["FOCUS"].state == IPS.Ok
+
+            # Busy sets come first, new waits for the Ok one
+            await harness.new("DIRECTION", {"IN": "Off", "OUT": "On"})
+            assert harness["DIRECTION"].values == {"IN": ISS.Off, "OUT": ISS.On}
+            assert harness["DIRECTION"].state == IPS.Ok
+            return harness.stats()
+
+    stats = asyncio.run(drive())
+    assert stats["latency"]["FOCUS"]["count"] == 1
+    assert stats["elements"]["defNumberVector"] == 1
@@ -0,0 +1,86 @@
+import asyncio
+import time
+from pathlib import Path
+
+import numpy
+import pytest
+
+from pyindi.device import device
+
+
+class Offloading(device):
+
+    def ISGetProperties(self, device=None):
+        pass
+
+    @device.offload(pool="thread")
+    def scale_in_thread(values, factor=2):
+        return [value * factor for value in values]
+
+    @device.offload(pool="process")
+    def scale_in_process(values, factor=2):
+        return [value * factor for value in values]
+
+    @device.offload(pool="process")
+    def ramp(n, delay=0):
+        time.sleep(delay)
+        return numpy.arange(n, dtype=float)
+
+
+def test_same_signature_for_both_pools():
+
+    async def scale():
+        dev = Offloading(name="O")
+        try:
+            return (await dev.scale_in_thread([1, 2], factor=3),
+                    await dev.scale_in_process([1, 2], factor=3))
+        finally:
+            dev.shutdown_pools()
+
+    assert asyncio.run(scale()) == ([3, 6], [3, 6])
+
+
+def test_self_is_rejected():
+    with pytest.raises(TypeError):
+        @device.offload(pool="process")
+        def method(self, values):
+            pass
+
+
+def test_shared_result():
+
+    async def ramp():
+        dev = Offloading(name="O")
+        try:
+            return await dev.ramp(1000)
+        finally:
+            dev.shutdown_pools()
+
+    array = asyncio.run(ramp())
+    assert array.sum() == sum(range(1000))
+
+
+@pytest.mark.skipif(not Path("/dev/shm").is_dir(), reason="no /dev/shm")
+def test_unclaimed_results_are_released():
+
+    def segments():
+        return set(Path("/dev/shm").glob("psm_*"))
+
+    async def abandon():
+        dev = Offloading(name="O")
+        try:
+            await dev.ramp(1)
+            # both running in the workers when their callers go away,
+            # one is cancelled, the other outlived by the pools
+            cancelled = asyncio.ensure_future(dev.ramp(1000, delay=0.5))
+            asyncio.ensure_future(dev.ramp(1000, delay=1))
+            await asyncio.sleep(0.2)
+            cancelled.cancel()
+            await asyncio.sleep(0.6)
+        finally:
+            dev.shutdown_pools()
+        await asyncio.sleep(0.6)
+
+    before = segments()
+    asyncio.run(abandon())
+    assert segments() <= before
@@ -0,0 +1,99 @@
+import asyncio
+import base64
+
+from pyindi.device.device import read_messages
+
+
+def read_all(chunks, **kwargs):
+    """The messages read_messages makes of the chunks of input"""
+
+    async def read():
+        reader = asyncio.StreamReader()
+        for chunk in chunks:
+            reader.feed_data(chunk)
+        reader.feed_eof()
+        messages = []
+        async for batch in read_messages(reader, **kwargs):
+            messages.extend(batch)
+        return messages
+
+    return asyncio.run(read())
+
+
+def uploads(message):
+    return [(upload.name, bytes(upload.value), upload.error)
+            for upload in message.uploads]
+
+
+def new_blob(data, name="x", device="D", prop="UPLOAD"):
+    text = base64.b64encode(data).decode()
+    return (f'<newBLOBVector device="{device}" name="{prop}">'
+            f'<oneBLOB name="{name}" size="{len(data)}" format=".bin">'
+            f'{text}</oneBLOB></newBLOBVector>\n').encode()
+
+
+def test_set_blob_is_not_an_upload():
+    # a setBLOBVector snooped from another driver goes to the
+    # parser as it is, its data is not taken for the next upload
+    other = base64.b64encode(b"OTHER").decode()
+    snooped = (f'<setBLOBVector device="CCD" name="IMAGE">'
+               f'<oneBLOB name="y" size="5" format=".bin">{other}</oneBLOB>'
+               f'</setBLOBVector>\n').encode()
+    messages = read_all([snooped, new_blob(b"MINE")])
+
+    assert [msg.tag for msg in messages] == ["setBLOBVector", "newBLOBVector"]
+    assert messages[0][0].text == other
+    assert uploads(messages[1]) == [("x", b"MINE", None)]
+
+
+def test_gt_in_attribute_value():
+    data = b"\x00\x01payload\xff" * 100
+    message = new_blob(data, prop="UP>LOAD").replace(
+        b'format=".bin"', b'format=".bin" label="a > b"')
+    before = b'<newNumberVector device="D" name="N>1"><oneNumber name="a>b">1'
+    messages = read_all([before, b'</oneNumber></newNumberVector>\n', message])
+
+    assert [msg.tag for msg in messages] == ["newNumberVector", "newBLOBVector"]
+    assert messages[0].get("name") == "N>1"
+    assert messages[1].get("name") == "UP>LOAD"
+    assert uploads(messages[1]) == [("x", data, None)]
+
+
+def test_upload_split_anywhere():
+    data = bytes(range(256)) * 40
+    stream = new_blob(data) + new_blob(b"second", name="y")
+    for size in (1, 3, 7, 100):
+        chunks = [stream[i:i + size] for i in range(0, len(stream), size)]
+        messages = read_all(chunks)
+        assert [uploads(msg) for msg in messages] == [
+            [("x", data, None)], [("y", b"second", None)]]
+
+
+def test_large_upload_in_chunks(tmp_path):
+    # 76 character base64 lines, fed in reads of odd sizes; the
+    # upload spills to a file above upload_memory
+    data = bytes(range(256)) * (2**14) + b"tail"
+    text = base64.encodebytes(data)
+    stream = (b'<newBLOBVector device="D" name="UPLOAD">\n'
+              b'<oneBLOB name="FILE" size="%d" format=".fits">\n' % len(data)
+              + text + b'</oneBLOB>\n</newBLOBVector>\n')
+    chunks = [stream[i:i + 65521] for i in range(0, len(stream), 65521)]
+    messages = read_all(chunks, upload_memory=2**16, upload_dir=tmp_path)
+
+    assert len(messages) == 1
+    upload, = messages[0].uploads
+    assert upload.error is None
+    assert (upload.name, upload.format, upload.nbytes) == ("FILE", ".fits", len(data))
+    path = upload.value
+    assert path.parent == tmp_path
+    assert path.read_bytes() == data
+    messages[0].close()
+    assert not path.exists()
+
+
+def test_upload_too_large():
+    data = bytes(1000)
+    messages = read_all([new_blob(data)], max_upload=999)
+    upload, = messages[0].uploads
+    assert upload.error is not None
+    assert messages[0].errors() == [upload.error]